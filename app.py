@@ -2,16 +2,32 @@
 # YT Downloader Plus - Web-based YouTube downloader
 # Flask application with yt-dlp integration
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, render_template, request, jsonify, send_file, stream_with_context
+import werkzeug.security
 import yt_dlp
 from yt_dlp.utils import DownloadError
 import os
+import atexit
+import json
 import threading
 import queue
 import time
 import socket
 import re
 import copy
+import uuid
+import functools
+import collections
+import itertools
+import contextlib
+import shutil
+import sqlite3
+import types
+import urllib.parse
+import io
+import tarfile
+import zipfile
+import unicodedata
 from typing import Any, cast
 from config import Config
 
@@ -21,15 +37,296 @@ app.config.from_object(Config)
 # Regex to strip ANSI escape codes
 ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
 
+class TimedRLock:
+    """RLock that adds up how long threads waited to acquire it
+
+    Uncontended acquisitions take the fast path and aren't timed. The totals
+    are updated while holding the lock itself, so they need no lock of their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.wait_seconds = 0.0
+        self.contended = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            self.wait_seconds += time.perf_counter() - started
+            self.contended += 1
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+    # threading.Condition needs the RLock internals to wait() on a re-entered lock
+    def _is_owned(self):
+        return self._lock._is_owned()  # type: ignore[attr-defined]
+
+    def _release_save(self):
+        return self._lock._release_save()  # type: ignore[attr-defined]
+
+    def _acquire_restore(self, state):
+        self._lock._acquire_restore(state)  # type: ignore[attr-defined]
+
+
+class Metrics:
+    """Counters and histograms for /metrics, rendered in the Prometheus text format
+
+    Gauges (queue depth, workers, throughput...) are read from the job
+    registry at scrape time instead; see metrics_endpoint().
+    """
+
+    PHASE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+    HELP = {
+        'downloaded_bytes_total': ('counter', 'Bytes received by download transfers'),
+        'jobs_finished_total': ('counter', 'Jobs that reached a final state, by status'),
+        'phase_duration_seconds': ('histogram', 'Duration of download pipeline phases'),
+        'stalls_total': ('counter', 'Downloads that made no progress for {}s or more before resuming'),
+        'fallbacks_total': ('counter', 'Download retries with a fallback applied, by fallback'),
+        'remembered_fallbacks_total': ('counter', 'Jobs that started with a fallback remembered for their site'),
+        'job_retries_total': ('counter', 'Failed jobs requeued through the retry API'),
+        'jobs_spilled_total': ('counter', 'Submissions queued on disk because the in-memory queue was full'),
+    }
+
+    def __init__(self, prefix='ytdl_'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.started_at = time.time()
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            self.counters[name, tuple(sorted(labels.items()))] += amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(self.PHASE_BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(self.PHASE_BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def value(self, name, **labels):
+        with self.lock:
+            return self.counters[name, tuple(sorted(labels.items()))]
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        pairs = [*labels, *extra]
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+    def sample_lines(self, name, kind, help_text, samples):
+        """Exposition lines for one metric family: [(labels, value)]"""
+        full_name = self.prefix + name
+        lines = [f'# HELP {full_name} {help_text}', f'# TYPE {full_name} {kind}']
+        lines.extend(f'{full_name}{self.format_labels(labels)} {value:g}' for labels, value in samples)
+        return lines
+
+    def render(self):
+        """Exposition lines for the recorded counters and histograms"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(values)) for key, values in self.histograms.items())
+        lines = []
+        for name, (kind, help_text) in self.HELP.items():
+            help_text = help_text.format(STALL_WARNING_SECONDS)
+            if kind == 'counter':
+                samples = [(labels, value) for (sample_name, labels), value in counters if sample_name == name]
+                lines.extend(self.sample_lines(name, kind, help_text, samples or [((), 0)]))
+                continue
+            full_name = self.prefix + name
+            lines.extend([f'# HELP {full_name} {help_text}', f'# TYPE {full_name} {kind}'])
+            for (sample_name, labels), values in histograms:
+                if sample_name != name:
+                    continue
+                for bound, count in zip(self.PHASE_BUCKETS, values):
+                    lines.append(f'{full_name}_bucket{self.format_labels(labels, [("le", f"{bound:g}")])} {count}')
+                lines.append(f'{full_name}_bucket{self.format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+                lines.append(f'{full_name}_sum{self.format_labels(labels)} {values[-2]:g}')
+                lines.append(f'{full_name}_count{self.format_labels(labels)} {values[-1]}')
+        return lines
+
+
+class JobScheduler:
+    """Queue of job IDs that hands workers the most deserving job, not the oldest
+
+    Order of picks:
+      1. bumped jobs (see bump()), most recently bumped first
+      2. the interactive class (single videos submitted directly) before the
+         bulk class (playlist/channel jobs and their entries); a bulk job
+         waiting longer than SCHEDULER_AGING_SECONDS counts as interactive
+      3. within a class, the client with the fewest running jobs (then the
+         one served longest ago), so one big channel can't crowd others out
+      4. within a client, FIFO, or shortest estimated duration first when
+         SCHEDULER_SHORTEST_FIRST is on
+    Same put()/get()/qsize() interface as queue.Queue, which it replaces.
+    """
+
+    INTERACTIVE = 'interactive'
+    BULK = 'bulk'
+
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.entries = {}  # job_id -> {'entry', 'client', 'priority', 'estimate', 'bump', 'seq', 'queued_at'}
+        self.seq = itertools.count()
+        self.bumps = itertools.count(1)
+        self.served = {}  # client -> dispatch number of its last pick
+
+    def put(self, job_id):
+        with status_lock:
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            options = job['_options']
+            interactive = job['download_type'] == 'single' and not job['parent_id']
+            entry = {
+                'entry': bool(job['parent_id']),
+                'client': options.get('client') or '',
+                'priority': self.INTERACTIVE if interactive else self.BULK,
+                'estimate': options.get('estimate'),
+                'bump': 0,
+                'seq': next(self.seq),
+                'queued_at': time.monotonic(),
+            }
+        with self.cond:
+            self.entries[job_id] = entry
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Remove and return the next job ID; raises queue.Empty after `timeout` seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            running = self.running_by_client()
+            with self.cond:
+                if self.entries:
+                    job_id = self.pick(self.entries, running, self.served)
+                    self.served[self.entries.pop(job_id)['client']] = next(self.seq)
+                    return job_id
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.cond.wait(remaining)
+
+    def task_done(self):
+        """Kept for queue.Queue compatibility; nothing waits on finished tasks"""
+
+    def qsize(self, entries=None):
+        """Queued jobs: all of them, only playlist/batch entries (True) or only submissions (False)"""
+        with self.cond:
+            if entries is None:
+                return len(self.entries)
+            return sum(1 for entry in self.entries.values() if entry['entry'] == entries)
+
+    @staticmethod
+    def running_by_client():
+        with status_lock:
+            return collections.Counter(job['_options'].get('client') or '' for job in jobs.values() if is_working(job))
+
+    @staticmethod
+    def pick(entries, running, served):
+        """Job ID to dispatch next from `entries`"""
+        bumped = [job_id for job_id, entry in entries.items() if entry['bump']]
+        if bumped:
+            return max(bumped, key=lambda job_id: entries[job_id]['bump'])
+
+        now = time.monotonic()
+
+        def priority(entry):
+            if entry['priority'] == JobScheduler.BULK and now - entry['queued_at'] < Config.SCHEDULER_AGING_SECONDS:
+                return 1
+            return 0
+
+        best = min(priority(entry) for entry in entries.values())
+        candidates = [(job_id, entry) for job_id, entry in entries.items() if priority(entry) == best]
+        oldest = {}
+        for _, entry in candidates:
+            oldest[entry['client']] = min(oldest.get(entry['client'], entry['seq']), entry['seq'])
+        client = min(oldest, key=lambda client: (running.get(client, 0), served.get(client, -1), oldest[client]))
+
+        def order(item):
+            entry = item[1]
+            if Config.SCHEDULER_SHORTEST_FIRST:
+                estimate = entry['estimate'] if entry['estimate'] is not None else float('inf')
+                return (estimate, entry['seq'])
+            return (entry['seq'],)
+
+        return min((item for item in candidates if item[1]['client'] == client), key=order)[0]
+
+    def bump(self, job_id):
+        """Move a queued job to the front; returns False if it isn't queued"""
+        with self.cond:
+            entry = self.entries.get(job_id)
+            if entry is None:
+                return False
+            entry['bump'] = next(self.bumps)
+            return True
+
+    def reorder(self, job_ids):
+        """Put queued jobs at the front in the given order; returns the IDs that were queued"""
+        moved = [job_id for job_id in reversed(job_ids) if self.bump(job_id)]
+        moved.reverse()
+        return moved
+
+    def snapshot(self, limit=50):
+        """The next `limit` job IDs in the order they would be dispatched now"""
+        running = self.running_by_client()
+        with self.cond:
+            entries = {job_id: dict(entry) for job_id, entry in self.entries.items()}
+            served = dict(self.served)
+        order = []
+        dispatches = itertools.count(max(served.values(), default=0) + 1)
+        while entries and len(order) < limit:
+            job_id = self.pick(entries, running, served)
+            entry = entries.pop(job_id)
+            running[entry['client']] += 1
+            served[entry['client']] = next(dispatches)
+            order.append((job_id, entry))
+        return order
+
+
 # Global state for managing downloads
-download_queue = queue.Queue(maxsize=100)  # Unlimited queue with 100 max pending
-download_status = {}
+download_queue = JobScheduler()  # Job IDs; at most MAX_QUEUED_JOBS submissions and MAX_QUEUED_ENTRIES entries, the rest spill (see SpillQueue)
+download_status = {}  # Server-wide fields (activity log)
+jobs = {}  # Job registry: job_id -> compact job record
 active_downloads_urls = set()  # Track URLs currently being downloaded
 queued_urls = set()  # Track URLs queued but not yet started
-cancel_event = threading.Event()
-status_lock = threading.RLock()
-worker_threads = []  # List of active worker threads
+worker_context = threading.local()  # .job: the job the current worker thread is running
+status_lock = TimedRLock()
+status_changed = threading.Condition(status_lock)  # Notified whenever status_version moves
+status_version = 0  # Monotonic counter bumped on every job/log change
+worker_threads = []  # Download worker threads by slot (worker_id - 1); None once retired
+busy_download_workers = 0  # Workers currently running a job
 MAX_CONCURRENT_DOWNLOADS = Config.MAX_CONCURRENT_DOWNLOADS  # Allow up to N simultaneous downloads
+download_worker_target = MAX_CONCURRENT_DOWNLOADS  # Current pool size; see set_download_workers()
+postprocess_queue = queue.Queue()  # (job_id, info, postprocessors) handed over by download workers
+POSTPROCESS_WORKERS = max(0, Config.POSTPROCESS_WORKERS if Config.POSTPROCESS_WORKERS is not None else (os.cpu_count() or 2))
+JOB_HISTORY_LIMIT = Config.JOB_HISTORY_LIMIT  # Finished jobs kept in the registry
+MAX_QUEUED_JOBS = Config.MAX_QUEUED_JOBS  # Pending submissions kept in memory; the rest spill to disk
+spill_lock = threading.Lock()  # Spill queue changes and the parents' '_spilled' counts; taken before status_lock
+recent_job_seconds = collections.deque(maxlen=50)  # Run times of the last finished jobs, for queue ETAs
+PROGRESS_PUBLISH_INTERVAL = 1.0 / max(0.1, Config.PROGRESS_UPDATES_PER_SECOND)
+JOB_SPAN_LIMIT = 200  # Timeline spans kept per job
+STALL_WARNING_SECONDS = 20  # No progress for this long is reported as a stall
+metrics = Metrics()
 
 DEFAULT_STATUS = {
     'is_downloading': False,
@@ -51,15 +348,292 @@ DEFAULT_STATUS = {
     'playlist_current': 0,
 }
 
+# Per-job record; keys starting with '_' are internal and never serialized
+DEFAULT_JOB = {
+    'id': '',
+    'url': '',
+    'status': 'queued',
+    'progress': 0,
+    'speed': '',
+    'eta': '',
+    'title': '',
+    'current_action': 'Queued for download',
+    'last_progress_at': 0,
+    'stalled_for': 0,
+    'logs': [],
+    'output_folder': '',
+    'mode': '',
+    'download_type': 'single',
+    'playlist_total': 0,
+    'playlist_completed': 0,
+    'playlist_current': 0,
+    'playlist_failed': 0,
+    'parent_id': '',  # Set on playlist/channel entries fanned out from a parent job
+    'playlist_index': 0,
+    'filename': '',  # Final output file, once completed
+    'downloaded_bytes': 0,
+    'created_at': 0,
+    'started_at': 0,
+    'finished_at': 0,
+}
+
+ACTIVE_JOB_STATES = ('starting', 'downloading', 'processing', 'finalizing')
+FINISHED_JOB_STATES = ('completed', 'error', 'cancelled')
+
+
 def get_download_status():
     """Get status dict for a download, initialized on first use"""
     with status_lock:
-        for key, value in DEFAULT_STATUS.items():
-            if key not in download_status:
-                download_status[key] = [] if key == 'logs' else value
+        if 'logs' not in download_status:
+            # (seq, line) pairs; seq is the status version the line was added at
+            download_status['logs'] = collections.deque(maxlen=Config.ACTIVITY_LOG_LIMIT)
+            download_status['logs_cleared_at'] = 0
     return download_status
 
 
+def logs_after(log, after):
+    """Return the (seq, line) entries of a log newer than `after`
+
+    Walks the deque from the newest end, so the cost is proportional to the
+    number of new lines rather than the log size.
+    """
+    with status_lock:
+        entries = []
+        for entry in reversed(log):
+            if entry[0] <= after:
+                break
+            entries.append(entry)
+    entries.reverse()
+    return entries
+
+
+def bump_status_version():
+    """Advance the status version and wake any event-stream listeners"""
+    global status_version
+    with status_lock:
+        status_version += 1
+        status_changed.notify_all()
+        return status_version
+
+
+def create_job(url, options, parent=None, record=None):
+    """Register a new queued job (or a playlist entry of `parent`) and return its record
+
+    `record` restores the fields of a job loaded from the job store.
+    """
+    job = dict(DEFAULT_JOB)
+    log_limit = options.get('log_limit') or Config.JOB_LOG_LIMIT
+    job['logs'] = collections.deque(maxlen=log_limit)
+    job['id'] = uuid.uuid4().hex[:12]
+    job['url'] = url
+    job['output_folder'] = options['folder']
+    job['mode'] = options['mode']
+    job['download_type'] = options['download_type']
+    job['created_at'] = time.time()
+    job['_options'] = dict(options)
+    job['_last_progress_publish'] = 0
+    job['_children'] = []
+    job['_cancel'] = threading.Event()
+    job['_speed_bps'] = 0  # Last published download speed, for the concurrency controller
+    job['_processes'] = set()  # yt-dlp subprocesses (ffmpeg) started for this job
+    job['_bytes_seen'] = 0  # downloaded_bytes of the current stream, for the byte counter
+    job['_output_path'] = ''  # Latest file yt-dlp reported writing, for stuck-job recovery
+    job['_intermediate_files'] = set()  # Files written along the way, see cleanup_intermediate_files()
+    job['_spans'] = collections.deque(maxlen=JOB_SPAN_LIMIT)  # Finished timeline spans, see begin_span()
+    job['_open_spans'] = {}  # phase -> span still running
+    job['_spilled'] = 0  # Entries waiting in the spill queue, see admit_entry()
+    job['_dropped_entries'] = 0  # Spilled entries cancelled before they were loaded
+    if parent is not None:
+        job['parent_id'] = parent['id']
+        job['playlist_index'] = options.get('playlist_index', 0)
+        job['title'] = options.get('entry_title', '')
+    if record is not None:
+        job.update((key, value) for key, value in record.items() if key in DEFAULT_JOB and key != 'logs')
+        job['_fanned_out'] = record.get('fanned_out', False)
+    if job['status'] == 'queued':
+        begin_span(job, 'queue')
+    with status_lock:
+        version = bump_status_version()
+        job['_version'] = version
+        job['_field_versions'] = {key: version for key in DEFAULT_JOB if key != 'logs'}
+        jobs[job['id']] = job
+        if Config.PERSIST_JOBS:
+            job_store.save(job)
+        if parent is not None:
+            parent['_children'].append(job)
+        else:
+            prune_jobs()
+    return job
+
+
+def prune_jobs():
+    """Drop the oldest finished top-level jobs (and their entries) beyond JOB_HISTORY_LIMIT"""
+    with status_lock:
+        finished = [
+            job for job in jobs.values()
+            if job['status'] in FINISHED_JOB_STATES and not job['parent_id']
+        ]
+        stale = finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]
+        stale_ids = []
+        for job in stale:
+            for child in job['_children']:
+                jobs.pop(child['id'], None)
+                stale_ids.append(child['id'])
+            del jobs[job['id']]
+            stale_ids.append(job['id'])
+        if stale:
+            bump_status_version()
+            if Config.PERSIST_JOBS:
+                job_store.delete(stale_ids)
+
+
+def top_level_jobs():
+    """Jobs submitted by clients, without fanned-out playlist entries"""
+    with status_lock:
+        return [job for job in jobs.values() if not job['parent_id']]
+
+
+def update_job(job, **fields):
+    """Update fields on a single job record, recording which ones changed"""
+    with status_lock:
+        changed = [key for key, value in fields.items() if job.get(key) != value]
+        if not changed:
+            return
+        version = bump_status_version()
+        for key in changed:
+            job[key] = fields[key]
+            job['_field_versions'][key] = version
+        job['_version'] = version
+        if 'status' in changed and job['status'] in FINISHED_JOB_STATES:
+            metrics.inc('jobs_finished_total', status=job['status'])
+            if job['started_at'] and not job.get('_fanned_out'):
+                recent_job_seconds.append(time.time() - job['started_at'])
+            for phase in list(job['_open_spans']):
+                end_span(job, phase, interrupted=True)
+        if Config.PERSIST_JOBS and not PERSISTED_JOB_FIELDS.isdisjoint(changed):
+            job_store.save(job)
+
+
+def begin_span(job, phase, name=None, **args):
+    """Start timing a phase of a job (queue, options, extraction, transfer...)
+
+    Each phase has at most one open span; end_span() closes it, keeps it on
+    the job's timeline and feeds the phase duration histogram.
+    """
+    job['_open_spans'][phase] = {
+        'phase': phase,
+        'name': name or phase,
+        'start': time.time(),
+        'args': args,
+        '_started': time.perf_counter(),
+    }
+
+
+def end_span(job, phase, **args):
+    """Close a job's open span for a phase, if any
+
+    Spans still open when a job finishes (failed, cancelled) are closed with
+    `interrupted` set and left out of the histogram.
+    """
+    span = job['_open_spans'].pop(phase, None)
+    if span is None:
+        return
+    span['duration'] = time.perf_counter() - span.pop('_started')
+    span['args'].update(args)
+    with status_lock:
+        job['_spans'].append(span)
+    if not span['args'].get('interrupted'):
+        metrics.observe('phase_duration_seconds', span['duration'], phase=phase)
+
+
+@contextlib.contextmanager
+def job_span(job, phase, name=None, **args):
+    """Time a block as one span of a job's timeline"""
+    begin_span(job, phase, name, **args)
+    try:
+        yield
+    finally:
+        end_span(job, phase)
+
+
+def job_timeline(job):
+    """A job's spans, oldest first; spans still running report their duration so far"""
+    now = time.perf_counter()
+    with status_lock:
+        spans = [dict(span) for span in job['_spans']]
+        for span in list(job['_open_spans'].values()):
+            running = {key: value for key, value in span.items() if key != '_started'}
+            running['duration'] = now - span['_started']
+            running['running'] = True
+            spans.append(running)
+    spans.sort(key=lambda span: span['start'])
+    for span in spans:
+        span['end'] = span['start'] + span['duration']
+    return spans
+
+
+def job_snapshot(job, include_logs=True):
+    """Return a JSON-safe copy of a job record"""
+    with status_lock:
+        snapshot = {key: value for key, value in job.items() if not key.startswith('_') and key != 'logs'}
+        if include_logs:
+            snapshot['logs'] = [line for _, line in job['logs']]
+        if job['status'] in ACTIVE_JOB_STATES and job['last_progress_at'] and not job['_children']:
+            snapshot['stalled_for'] = max(0, int(time.time() - job['last_progress_at']))
+        else:
+            snapshot['stalled_for'] = 0
+    return snapshot
+
+
+def spilled_job_snapshot(entry):
+    """Job-like view of a submission waiting in the spill queue (see SpillQueue.get())"""
+    options = json.loads(entry['options'])
+    position = download_queue.qsize(entries=bool(entry['parent_id'])) + entry['position']
+    wait, start = estimated_start(position)
+    return {
+        **{key: value for key, value in DEFAULT_JOB.items() if key != 'logs'},
+        'id': entry['id'],
+        'parent_id': entry['parent_id'],
+        'playlist_index': options.get('playlist_index', 0),
+        'url': entry['url'],
+        'output_folder': options['folder'],
+        'mode': options['mode'],
+        'download_type': options['download_type'],
+        'created_at': entry['created_at'],
+        'current_action': f'Waiting in the overflow queue (position {position + 1})',
+        'spilled': True,
+        'position': position,
+        'estimated_wait': wait,
+        'estimated_start': start,
+        'logs': [],
+        'stalled_for': 0,
+    }
+
+
+def is_working(job):
+    """True for jobs a worker is actively downloading (fanned-out parents only wait)"""
+    return job['status'] in ACTIVE_JOB_STATES and not job['_children']
+
+
+def get_focus_job():
+    """Pick the job the single-download UI should follow
+
+    The most recently started active download wins so progress does not jump
+    between concurrent jobs; then a playlist parent waiting on its entries;
+    otherwise fall back to the newest job.
+    """
+    with status_lock:
+        active = [job for job in jobs.values() if is_working(job)]
+        if not active:
+            active = [job for job in jobs.values() if job['status'] in ACTIVE_JOB_STATES]
+        if active:
+            return max(active, key=lambda job: job['started_at'])
+        top_level = top_level_jobs()
+        if top_level:
+            return top_level[-1]
+    return None
+
+
 def strip_ansi(text):
     """Remove ANSI escape sequences from text"""
     if not isinstance(text, str):
@@ -68,202 +642,415 @@ def strip_ansi(text):
 
 
 class YtdlpLogger:
+    def __init__(self, job=None):
+        self.job = job
+
     def debug(self, msg):
         if msg:
-            add_log(str(msg))
+            add_log(str(msg), self.job)
 
     def warning(self, msg):
         if msg:
-            add_log(f"⚠️ {msg}")
+            add_log(f"⚠️ {msg}", self.job)
 
     def error(self, msg):
         if msg:
-            add_log(f"✗ {msg}")
+            add_log(f"✗ {msg}", self.job)
 
 
-def add_log(message):
-    """Add a message to the download logs"""
+def add_log(message, job=None):
+    """Add a message to the activity log and, if given, the job's own log"""
     with status_lock:
         timestamp = time.strftime('%H:%M:%S')
         clean_msg = strip_ansi(message)
         clean_msg = clean_msg.replace('Unknown B/s ETA Unknown', '- ETA -')
         clean_msg = clean_msg.replace('ETA Unknown', 'ETA -')
-        if 'logs' not in download_status:
-            download_status['logs'] = []
-        download_status['logs'].append(f"[{timestamp}] {clean_msg}")
-        # Keep only last 100 log entries
-        if len(download_status['logs']) > 100:
-            download_status['logs'] = download_status['logs'][-100:]
+        entry = (bump_status_version(), f"[{timestamp}] {clean_msg}")
+        get_download_status()
+        # Bounded deques drop the oldest entry in O(1)
+        download_status['logs'].append(entry)
+        if job is not None:
+            job['logs'].append(entry)
 
 
-def cleanup_intermediate_files(folder, video_title):
-    """Remove intermediate files like thumbnails, keeping only the final media file (fast version)"""
-    try:
-        # Files to remove after download (intermediate files)
-        cleanup_exts = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
-        
-        # Only walk the immediate download folder, not subfolders (much faster)
+def cleanup_intermediate_files(job, keep=()):
+    """Remove the intermediate files this job left behind, keeping its final files
+
+    The hooks record each file yt-dlp wrote along the way (thumbnails,
+    .part/.ytdl leftovers, format streams before merging or audio
+    extraction) in job['_intermediate_files'], so only those are touched.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    with status_lock:
+        paths = sorted(job['_intermediate_files'])
+        job['_intermediate_files'].clear()
+    for path in paths:
+        if os.path.abspath(path) in keep:
+            continue
         try:
-            files = os.listdir(folder)
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in cleanup_exts:
-                    full_path = os.path.join(folder, file)
-                    try:
-                        os.remove(full_path)
-                        add_log(f"Cleaned up: {file}")
-                    except Exception:
-                        pass  # Silent fail on cleanup
-        except Exception:
-            pass  # Silent fail if folder doesn't exist
-    except Exception:
-        pass  # Silent fail on cleanup warning
+            os.remove(path)
+            add_log(f"Cleaned up: {os.path.basename(path)}", job)
+        except OSError:
+            pass  # Already gone (yt-dlp removes most of these itself)
+
+
+def format_speed(bytes_per_second):
+    """Format a numeric download speed for display"""
+    if not bytes_per_second:
+        return ''
+    return f"{bytes_per_second / 1048576:.2f} MiB/s"
+
+
+def format_eta(seconds):
+    """Format a numeric ETA as MM:SS or H:MM:SS"""
+    if seconds is None:
+        return ''
+    minutes, secs = divmod(int(seconds), 60)
+    if minutes >= 60:
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def parse_rate(value):
+    """Bytes/sec from a number or a yt-dlp style size ('500K', '2.5M'); None/0 = unlimited"""
+    if value in (None, '', 0):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        rate = float(value)
+    elif isinstance(value, str):
+        rate = yt_dlp.utils.parse_bytes(value.strip())
+    else:
+        rate = None
+    if rate is None or rate < 0:
+        raise ValueError(f"Invalid rate: {value!r}")
+    return rate or None
+
+
+def parse_clock(value):
+    """Minutes since midnight for an 'HH:MM' string"""
+    hours, minutes = value.split(':')
+    if not (0 <= int(hours) < 24 and 0 <= int(minutes) < 60):
+        raise ValueError(f"Invalid time: {value!r}")
+    return int(hours) * 60 + int(minutes)
+
+
+class BandwidthLimiter:
+    """Token-bucket cap on the total download rate, shared by every job
+
+    The progress hook reports each job's new bytes from its download thread;
+    a job that gets ahead of its allowance sleeps right there until tokens
+    refill. A job's allowance is its fair share of the total plus whatever
+    the other active jobs leave unused, so one fragment-parallel download
+    can't starve the rest while a lone download still gets the full cap.
+    An optional per-job cap applies on top, and schedule windows replace
+    the total cap at certain times of day.
+    """
+
+    BURST_SECONDS = 1.0  # Bucket size, in seconds of the current rate
+    IDLE_SECONDS = 3.0  # A job silent this long no longer counts as active
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limit = None
+        self.per_job_limit = None
+        self.schedule = []  # (start minute, end minute, rate, 'HH:MM', 'HH:MM')
+        self.streams = {}  # job id -> per-job accounting, see consume()
+        self.configure(Config.BANDWIDTH_LIMIT, Config.BANDWIDTH_PER_JOB_LIMIT, Config.BANDWIDTH_SCHEDULE)
+
+    def configure(self, limit, per_job_limit, schedule):
+        """Replace the settings; raises ValueError for bad values"""
+        windows = []
+        for window in schedule or []:
+            if isinstance(window, dict):
+                start, end, rate = window.get('start'), window.get('end'), window.get('limit')
+            else:
+                start, end, rate = window
+            windows.append((parse_clock(start), parse_clock(end), parse_rate(rate), start, end))
+        limit, per_job_limit = parse_rate(limit), parse_rate(per_job_limit)
+        with self.lock:
+            self.limit, self.per_job_limit, self.schedule = limit, per_job_limit, windows
+
+    @property
+    def active(self):
+        """True when any cap could apply (checked on the progress hook's hot path)"""
+        return bool(self.limit or self.per_job_limit or self.schedule)
+
+    def current_limit(self):
+        """Total cap in effect right now: a matching schedule window, else the base limit"""
+        now = time.localtime()
+        minute = now.tm_hour * 60 + now.tm_min
+        for start, end, rate, _, _ in self.schedule:
+            # Windows may wrap past midnight (e.g. 22:00-06:00)
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return rate
+        return self.limit
+
+    def consume(self, job, downloaded_bytes):
+        """Account for a job's progress and sleep while it is over its allowance"""
+        with self.lock:
+            now = time.monotonic()
+            stream = self.streams.get(job['id'])
+            if stream is None or downloaded_bytes < stream['bytes']:
+                # New job or next file (e.g. audio after video): start from here
+                self.streams[job['id']] = {'bytes': downloaded_bytes, 'seen': now, 'debt_until': now, 'rate': 0.0}
+                return
+            delta = downloaded_bytes - stream['bytes']
+            elapsed = max(now - stream['seen'], 1e-3)
+            stream['bytes'] = downloaded_bytes
+            stream['seen'] = now
+            stream['rate'] = 0.7 * stream['rate'] + 0.3 * (delta / elapsed)
+            for job_id in [job_id for job_id, other in self.streams.items() if now - other['seen'] > self.IDLE_SECONDS]:
+                del self.streams[job_id]
+
+            allowance = self.allowance(job['id'])
+            if not allowance or not delta:
+                return
+            # Leaky-bucket form: each job owes time for the bytes it used
+            # and may run at most BURST_SECONDS ahead of its allowance
+            stream['debt_until'] = max(stream['debt_until'], now - self.BURST_SECONDS) + delta / allowance
+            wait = stream['debt_until'] - now
+
+        while wait > 0 and not job['_cancel'].is_set():
+            time.sleep(min(wait, 0.5))
+            wait -= 0.5
 
+    def allowance(self, job_id):
+        """Bytes/sec a job may use now (caller holds the lock); None = unlimited"""
+        total = self.current_limit()
+        allowance = None
+        if total:
+            share = total / len(self.streams)
+            # Capacity slow jobs leave unused is split between the jobs
+            # running at (or near) their share, which includes this one
+            unused = sum(max(0.0, share - other['rate']) for other_id, other in self.streams.items() if other_id != job_id)
+            hungry = 1 + sum(1 for other_id, other in self.streams.items() if other_id != job_id and other['rate'] >= 0.8 * share)
+            allowance = share + unused / hungry
+        if self.per_job_limit:
+            allowance = min(allowance or self.per_job_limit, self.per_job_limit)
+        return allowance
 
-def progress_hook(d):
-    """Callback for yt-dlp progress updates"""
-    if cancel_event.is_set():
+    def describe(self):
+        """Settings and live per-job rates for the API"""
+        with self.lock:
+            return {
+                'limit': self.limit,
+                'per_job_limit': self.per_job_limit,
+                'schedule': [{'start': start, 'end': end, 'limit': rate} for _, _, rate, start, end in self.schedule],
+                'current_limit': self.current_limit(),
+                'jobs': {job_id: format_speed(stream['rate']) for job_id, stream in self.streams.items()},
+            }
+
+
+bandwidth = BandwidthLimiter()
+
+
+def postprocessor_hook(job, d):
+    """Callback for yt-dlp post-processor steps; stops a cancelled job between steps"""
+    phase = 'merge' if d.get('postprocessor') == 'Merger' else 'postprocess'
+    if d['status'] == 'started':
+        info = d.get('info_dict') or {}
+        begin_span(job, phase, d.get('postprocessor'), filename=os.path.basename(info.get('filepath') or ''))
+        # Written thumbnails are only needed until they are embedded
+        job['_intermediate_files'].update(
+            thumbnail['filepath'] for thumbnail in info.get('thumbnails') or [] if thumbnail.get('filepath')
+        )
+    elif d['status'] == 'finished':
+        end_span(job, phase)
+        job['_output_path'] = (d.get('info_dict') or {}).get('filepath') or job['_output_path']
+    if job['_cancel'].is_set():
         raise DownloadError("Cancelled by user")
-    with status_lock:
-        info = d.get('info_dict') if isinstance(d, dict) else None
+
+
+_ytdlp_popen_init = yt_dlp.utils.Popen.__init__
+
+
+def _job_popen_init(self, *args, **kwargs):
+    """yt-dlp's Popen, remembering which job started the process
+
+    FFmpeg merges, audio extraction and HLS downloads all run through
+    yt_dlp.utils.Popen; tracking them lets cancel_job() stop them too.
+    """
+    _ytdlp_popen_init(self, *args, **kwargs)
+    job = getattr(worker_context, 'job', None)
+    if job is not None:
+        with status_lock:
+            job['_processes'].add(self)
+        if job['_cancel'].is_set():
+            self.kill()
+
+
+yt_dlp.utils.Popen.__init__ = _job_popen_init
+
+
+def progress_hook(job, d):
+    """Callback for yt-dlp progress updates, bound to a single job
+
+    yt-dlp calls this for every chunk, so 'downloading' updates are computed
+    from the numeric fields only and published at most
+    PROGRESS_UPDATES_PER_SECOND times per job; other states always publish.
+    """
+    if job['_cancel'].is_set():
+        raise DownloadError("Cancelled by user")
+
+    status = d['status']
+    downloaded_bytes = d.get('downloaded_bytes') or 0
+    if downloaded_bytes != job['_bytes_seen']:
+        # A smaller value is the next stream (e.g. audio after video) starting over
+        metrics.inc('downloaded_bytes_total', downloaded_bytes - job['_bytes_seen'] if downloaded_bytes > job['_bytes_seen'] else downloaded_bytes)
+        job['_bytes_seen'] = downloaded_bytes
+    if status == 'downloading':
+        if bandwidth.active:
+            bandwidth.consume(job, downloaded_bytes)
+        if 'transfer' not in job['_open_spans']:
+            # First chunk of a stream
+            info = d.get('info_dict') or {}
+            begin_span(job, 'transfer', f"transfer {info.get('format_id') or ''}".strip(), filename=os.path.basename(d.get('filename') or ''))
+            if d.get('tmpfilename'):
+                job['_intermediate_files'].add(d['tmpfilename'])
+            if d.get('filename'):
+                job['_intermediate_files'].add(d['filename'] + '.ytdl')
+        now = time.monotonic()
+        if now - job['_last_progress_publish'] < PROGRESS_PUBLISH_INTERVAL:
+            return
+        job['_last_progress_publish'] = now
+
+        if job['status'] == 'downloading' and time.time() - job['last_progress_at'] >= STALL_WARNING_SECONDS:
+            metrics.inc('stalls_total')
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total_bytes:
+            percent = min(100.0, downloaded_bytes * 100.0 / total_bytes)
+        else:
+            percent = job['progress']
+
+        speed = d.get('speed')
+        if not speed and downloaded_bytes and d.get('elapsed'):
+            speed = downloaded_bytes / d['elapsed']
+        job['_speed_bps'] = speed or 0
+
+        # Show progress stage
+        if percent < 5:
+            stage = 'Initializing download'
+        elif percent < 25:
+            stage = 'Downloading stream'
+        elif percent < 75:
+            stage = 'Downloading data'
+        elif percent < 95:
+            stage = 'Completing download'
+        else:
+            stage = 'Finalizing download'
+
+        updates = {
+            'status': 'downloading',
+            'progress': percent,
+            'speed': format_speed(speed),
+            'eta': format_eta(d.get('eta')),
+            'current_action': f'{stage} ({percent:.1f}%)',
+            'last_progress_at': time.time(),
+        }
+        info = d.get('info_dict')
         if info:
+            updates['title'] = info.get('title', 'Unknown')
             playlist_total = info.get('playlist_count')
             playlist_index = info.get('playlist_index')
             if isinstance(playlist_total, int) and playlist_total > 1:
-                download_status['playlist_total'] = playlist_total
+                updates['playlist_total'] = playlist_total
             if isinstance(playlist_index, int) and playlist_index > 0:
-                download_status['playlist_current'] = playlist_index
-
-        if d['status'] == 'downloading':
-            # Extract progress information and strip ANSI
-            percent_str = strip_ansi(d.get('_percent_str', '0%')).strip()
-            speed_str = strip_ansi(d.get('_speed_str', 'N/A')).strip()
-            eta_str = strip_ansi(d.get('_eta_str', 'N/A')).strip()
-            
-            # Parse percentage efficiently, fallback to byte-based calc
-            percent = None
-            if percent_str and percent_str != '0%':
-                try:
-                    # Remove % and any non-numeric characters except dot
-                    clean_percent = re.sub(r'[^\d.]', '', percent_str)
-                    percent = float(clean_percent)
-                except Exception:
-                    percent = None
+                updates['playlist_current'] = playlist_index
+        update_job(job, **updates)
+        return
 
-            if percent is None:
-                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-                downloaded_bytes = d.get('downloaded_bytes')
-                if total_bytes and downloaded_bytes is not None:
-                    try:
-                        percent = (float(downloaded_bytes) / float(total_bytes)) * 100
-                        percent_str = f"{percent:.1f}%"
-                    except Exception:
-                        percent = None
+    updates = {}
+    with status_lock:
+        info = d.get('info_dict')
+        if info:
+            playlist_total = info.get('playlist_count')
+            playlist_index = info.get('playlist_index')
+            if isinstance(playlist_total, int) and playlist_total > 1:
+                updates['playlist_total'] = playlist_total
+            if isinstance(playlist_index, int) and playlist_index > 0:
+                updates['playlist_current'] = playlist_index
 
-            if percent is None:
-                percent = download_status.get('progress', 0)
-            
-            download_status['progress'] = percent
-            download_status['status'] = 'downloading'
-            if speed_str in ('', 'N/A') or 'Unknown' in speed_str:
-                downloaded_bytes = d.get('downloaded_bytes')
-                elapsed = d.get('elapsed')
-                if downloaded_bytes is not None and elapsed:
-                    try:
-                        speed = float(downloaded_bytes) / float(elapsed)
-                        speed_str = f"{speed/1024/1024:.2f} MiB/s"
-                    except Exception:
-                        pass
-            if eta_str in ('', 'N/A') or 'Unknown' in eta_str:
-                eta_str = ''
-            download_status['speed'] = speed_str
-            download_status['eta'] = eta_str
-            download_status['last_progress_at'] = time.time()
-            download_status['stalled_for'] = 0
-            
-            # Get title if available
-            if 'info_dict' in d:
-                download_status['title'] = d['info_dict'].get('title', 'Unknown')
-            
-            # Show progress stage
-            if percent < 5:
-                download_status['current_action'] = f'Initializing download ({percent_str})'
-            elif percent < 25:
-                download_status['current_action'] = f'Downloading stream ({percent_str})'
-            elif percent < 75:
-                download_status['current_action'] = f'Downloading data ({percent_str})'
-            elif percent < 95:
-                download_status['current_action'] = f'Completing download ({percent_str})'
-            else:
-                download_status['current_action'] = f'Finalizing download ({percent_str})'
-            
-        elif d['status'] == 'finished':
-            download_status['status'] = 'processing'
-            download_status['progress'] = 98
-            download_status['speed'] = ''
-            download_status['eta'] = 'Processing...'
-            download_status['current_action'] = 'Extracting and processing...'
-            download_status['last_progress_at'] = time.time()
-            download_status['stalled_for'] = 0
-            add_log("Download finished, extracting and processing...")
+        if status == 'finished':
+            job['_speed_bps'] = 0
+            job['_bytes_seen'] = 0
+            job['_output_path'] = d.get('filename') or job['_output_path']
+            if d.get('filename'):
+                # A format stream is intermediate if it gets merged or converted
+                job['_intermediate_files'].add(d['filename'])
+            end_span(job, 'transfer', bytes=d.get('total_bytes') or d.get('downloaded_bytes') or 0)
+            updates['status'] = 'processing'
+            updates['progress'] = 98
+            updates['speed'] = ''
+            updates['eta'] = 'Processing...'
+            updates['current_action'] = 'Extracting and processing...'
+            updates['last_progress_at'] = time.time()
+            add_log("Download finished, extracting and processing...", job)
             if info:
                 playlist_index = info.get('playlist_index')
                 if isinstance(playlist_index, int) and playlist_index > 0:
-                    download_status['playlist_completed'] = max(
-                        download_status.get('playlist_completed', 0),
+                    updates['playlist_completed'] = max(
+                        job.get('playlist_completed', 0),
                         playlist_index
                     )
+            # Let the next chunk of a following stream publish immediately
+            job['_last_progress_publish'] = 0
             
-        elif d['status'] == 'postprocessing':
+        elif status == 'postprocessing':
             # Detect what's being post-processed
             pp_info = d.get('postprocessor', 'unknown')
             
             if 'audio' in str(pp_info).lower():
-                download_status['current_action'] = 'Extracting audio...'
-                add_log("Extracting audio from video...")
+                updates['current_action'] = 'Extracting audio...'
+                add_log("Extracting audio from video...", job)
             elif 'ffmpeg' in str(pp_info).lower():
-                download_status['current_action'] = 'Merging video and audio...'
-                add_log("Merging video and audio...")
+                updates['current_action'] = 'Merging video and audio...'
+                add_log("Merging video and audio...", job)
             elif 'metadata' in str(pp_info).lower():
-                download_status['current_action'] = 'Embedding metadata...'
-                add_log("Embedding metadata and thumbnails...")
+                updates['current_action'] = 'Embedding metadata...'
+                add_log("Embedding metadata and thumbnails...", job)
             else:
-                download_status['current_action'] = f'Post-processing ({pp_info})...'
-                add_log(f"Post-processing: {pp_info}")
+                updates['current_action'] = f'Post-processing ({pp_info})...'
+                add_log(f"Post-processing: {pp_info}", job)
             
-            download_status['status'] = 'processing'
-            download_status['progress'] = 99
-            download_status['speed'] = ''
-            download_status['eta'] = 'Finalizing...'
-            download_status['last_progress_at'] = time.time()
-            download_status['stalled_for'] = 0
+            updates['status'] = 'processing'
+            updates['progress'] = 99
+            updates['speed'] = ''
+            updates['eta'] = 'Finalizing...'
+            updates['last_progress_at'] = time.time()
             
-        elif d['status'] == 'error':
-            download_status['status'] = 'error'
+        elif status == 'error':
+            updates['status'] = 'error'
             error_msg = str(d.get('error', 'Unknown error'))
-            add_log(f"Error: {error_msg}")
+            add_log(f"Error: {error_msg}", job)
+
+        update_job(job, **updates)
 
 
-def build_youtube_extractor_args(allow_fallback_clients=False):
-    """Build YouTube extractor args with sensible client filtering."""
+def resolve_youtube_extractor_args(allow_fallback_clients=False):
+    """Resolve YouTube extractor args with sensible client filtering.
+
+    Returns (extractor_args or None, notes about disabled clients).
+    """
     po_tokens = build_po_tokens()
     clients = list(Config.YOUTUBE_PLAYER_CLIENTS)
+    notes = []
 
     if not Config.YOUTUBE_PO_TOKEN_IOS and 'ios' in clients:
         clients.remove('ios')
-        add_log("iOS client disabled (missing PO token)")
+        notes.append("iOS client disabled (missing PO token)")
 
     if not Config.YOUTUBE_PO_TOKEN_MWEB and 'mweb' in clients:
         clients.remove('mweb')
-        add_log("mweb client disabled (missing PO token)")
+        notes.append("mweb client disabled (missing PO token)")
 
     if not Config.YOUTUBE_PO_TOKEN_ANDROID and 'android' in clients:
         clients.remove('android')
-        add_log("android client disabled (missing PO token)")
+        notes.append("android client disabled (missing PO token)")
 
     if not getattr(Config, 'ALLOW_DRM_CLIENTS', False) and 'tv' in clients:
         clients.remove('tv')
-        add_log("TV client disabled (DRM-prone formats)")
+        notes.append("TV client disabled (DRM-prone formats)")
 
     if allow_fallback_clients:
         for client in ['web', 'mweb', 'android']:
@@ -279,7 +1066,7 @@ def build_youtube_extractor_args(allow_fallback_clients=False):
             clients.append('ios')
 
     if not clients and not allow_fallback_clients and not po_tokens:
-        return None
+        return None, notes
 
     if not clients:
         clients = ['web']
@@ -291,160 +1078,904 @@ def build_youtube_extractor_args(allow_fallback_clients=False):
     if po_tokens:
         extractor_args['po_token'] = po_tokens
 
-    return {'youtube': extractor_args}
+    return {'youtube': extractor_args}, notes
 
 
-def get_ydl_opts(folder, mode, resolution, subtitles=False, embed_thumbnail=False):
-    """Build yt-dlp options based on user settings"""
-    
-    # Path to local FFmpeg binaries if they exist
-    bin_path = os.path.join(os.getcwd(), 'bin')
-    ffmpeg_exe = os.path.join(bin_path, 'ffmpeg.exe')
-    ffmpeg_path = bin_path if os.path.exists(ffmpeg_exe) or os.path.exists(os.path.join(bin_path, 'ffmpeg')) else None
+class RuntimeEnvironment:
+    """FFmpeg, Node.js, cookies and extractor settings resolved once
 
-    if ffmpeg_path:
-        add_log(f"Using local FFmpeg from: {bin_path}")
-    else:
-        # Check if ffmpeg is in system path
-        import shutil
-        if shutil.which('ffmpeg'):
-            pass # add_log("Using system FFmpeg")
-        else:
-            add_log("⚠️ Warning: FFmpeg not found! Audio extraction and video merging will fail.")
-
-    extractor_args = build_youtube_extractor_args()
-
-    opts = {
-        'outtmpl': {
-            'default': os.path.join(folder, '%(title)s [%(id)s].%(ext)s'),
-            'playlist': os.path.join(folder, '%(playlist)s', '%(playlist_index)s - %(title)s [%(id)s].%(ext)s'),
-        },
-        'progress_hooks': [progress_hook],
-        'logger': YtdlpLogger(),
-        'quiet': True,
-        'no_warnings': True,
-        'continuedl': True,
-        'retries': Config.RETRIES,
-        'fragment_retries': Config.FRAGMENT_RETRIES,
-        'retry_sleep': {
-            'http': 2,
-            'fragment': 2,
-            'extractor': 2,
-        },
-        'ignoreerrors': False,
-        'concurrent_fragment_downloads': Config.CONCURRENT_FRAGMENT_DOWNLOADS,
-        'nocheckcertificate': True,
-        'socket_timeout': Config.SOCKET_TIMEOUT,
-        'geo_bypass': True,
-        'updatetime': False,
-        'buffer_size': 16384,  # Larger buffer for faster I/O
-        'http_chunk_size': Config.HTTP_CHUNK_SIZE,
-        # Browser-like headers to avoid 403 Forbidden
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-us,en;q=0.5',
-            'Sec-Fetch-Mode': 'navigate',
-        },
-        **({'extractor_args': extractor_args} if extractor_args else {})
-    }
+    Probing bin/ and PATH for every job is wasted work on large playlists,
+    so the results are cached here along with an immutable base options
+    dict. The environment is rebuilt by /api/runtime/refresh or when the
+    bin/ folder or cookies file changes on disk.
+    """
+
+    def __init__(self):
+        self.bin_path = os.path.join(os.getcwd(), 'bin')
+        self.signature = self.current_signature()
 
-    if Config.COOKIES_FILE and os.path.exists(Config.COOKIES_FILE):
-        opts['cookiefile'] = Config.COOKIES_FILE
-        add_log(f"Using cookies file: {Config.COOKIES_FILE}")
-    elif Config.COOKIES_FROM_BROWSER:
-        opts['cookiesfrombrowser'] = (Config.COOKIES_FROM_BROWSER,)
-        add_log(f"Using cookies from browser: {Config.COOKIES_FROM_BROWSER}")
-
-    if ffmpeg_path:
-        opts['ffmpeg_location'] = ffmpeg_path
-
-    # Prefer Node.js for YouTube JS runtime when available
-    import shutil
-    if Config.USE_NODE_RUNTIME:
-        node_path = shutil.which('node')
-        if not node_path:
-            local_node = os.path.join(bin_path, 'node.exe')
+        # Path to local FFmpeg binaries if they exist
+        local_ffmpeg = (
+            os.path.exists(os.path.join(self.bin_path, 'ffmpeg.exe'))
+            or os.path.exists(os.path.join(self.bin_path, 'ffmpeg'))
+        )
+        self.ffmpeg_location = self.bin_path if local_ffmpeg else None
+        self.ffmpeg_available = local_ffmpeg or bool(shutil.which('ffmpeg'))
+
+        # Node.js: system PATH first, then the portable copy in bin/
+        self.system_node_path = shutil.which('node')
+        self.node_path = self.system_node_path
+        if not self.node_path:
+            local_node = os.path.join(self.bin_path, 'node.exe')
             if os.path.exists(local_node):
-                node_path = local_node
-        if node_path:
+                self.node_path = local_node
+
+        self.cookiefile = None
+        self.cookies_from_browser = None
+        if Config.COOKIES_FILE and os.path.exists(Config.COOKIES_FILE):
+            self.cookiefile = Config.COOKIES_FILE
+        elif Config.COOKIES_FROM_BROWSER:
+            self.cookies_from_browser = Config.COOKIES_FROM_BROWSER
+
+        self.extractor_args, self.extractor_notes = resolve_youtube_extractor_args()
+        self.fallback_extractor_args, self.fallback_extractor_notes = resolve_youtube_extractor_args(
+            allow_fallback_clients=True
+        )
+        self.base_ydl_opts = self.build_base_ydl_opts()
+        self.created_at = time.time()
+
+    def current_signature(self):
+        """mtimes of the files that influence the environment"""
+        signature = []
+        for path in (self.bin_path, Config.COOKIES_FILE):
+            try:
+                signature.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def is_stale(self):
+        return self.current_signature() != self.signature
+
+    def build_base_ydl_opts(self):
+        """Job-independent yt-dlp options; jobs shallow-copy and overlay them"""
+        opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'continuedl': True,
+            'retries': Config.RETRIES,
+            'fragment_retries': Config.FRAGMENT_RETRIES,
+            'retry_sleep': {
+                'http': 2,
+                'fragment': 2,
+                'extractor': 2,
+            },
+            'ignoreerrors': False,
+            'concurrent_fragment_downloads': Config.CONCURRENT_FRAGMENT_DOWNLOADS,
+            'nocheckcertificate': True,
+            'socket_timeout': Config.SOCKET_TIMEOUT,
+            'geo_bypass': True,
+            'updatetime': False,
+            'buffer_size': 16384,  # Larger buffer for faster I/O
+            'http_chunk_size': Config.HTTP_CHUNK_SIZE,
+            # Browser-like headers to avoid 403 Forbidden
+            'http_headers': {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'en-us,en;q=0.5',
+                'Sec-Fetch-Mode': 'navigate',
+            },
+            # Enable remote components for EJS challenge solver (recommended by yt-dlp)
+            'remote_components': ['ejs:github'],
+        }
+        if self.extractor_args:
+            opts['extractor_args'] = self.extractor_args
+        if self.cookiefile:
+            opts['cookiefile'] = self.cookiefile
+        elif self.cookies_from_browser:
+            opts['cookiesfrombrowser'] = (self.cookies_from_browser,)
+        if self.ffmpeg_location:
+            opts['ffmpeg_location'] = self.ffmpeg_location
+        # Prefer Node.js for YouTube JS runtime when available
+        if Config.USE_NODE_RUNTIME and self.node_path:
             opts['js_runtimes'] = {
                 'node': {
-                    'path': node_path
+                    'path': self.node_path
                 }
             }
-        else:
-            add_log("⚠️ Warning: Node.js runtime not found. Some YouTube formats may be missing.")
+        return types.MappingProxyType(opts)
 
-    # Enable remote components for EJS challenge solver (recommended by yt-dlp)
-    opts['remote_components'] = ['ejs:github']
-    
-    # Post-processors list
-    pps = []
+    def describe(self):
+        return {
+            'ffmpeg_location': self.ffmpeg_location,
+            'ffmpeg_available': self.ffmpeg_available,
+            'node_path': self.node_path,
+            'cookiefile': self.cookiefile,
+            'cookies_from_browser': self.cookies_from_browser,
+            'extractor_args': self.extractor_args,
+            'created_at': self.created_at,
+        }
 
-    if mode == "Audio":
-        # Audio-only mode: extract best audio as MP3
-        opts.update({
-            'format': 'bestaudio/best',
-        })
-        pps.append({
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '320',
-        })
-        add_log(f"Mode: Audio extraction (MP3 320kbps)")
-    else:
-        # Video mode with resolution selection
-        if resolution == "Best":
-            # Default to highest possible quality
-            fmt = 'bestvideo*+bestaudio/best'
-        else:
-            try:
-                height = int(resolution.split('p')[0])
-                fmt = f'bestvideo*[height<={height}]+bestaudio/best[height<={height}]/best'
-            except Exception:
-                fmt = 'bestvideo*+bestaudio/best'
 
-        opts.update({
-            'format': fmt,
-            'merge_output_format': 'mkv',
-            'prefer_ffmpeg': True,
-        })
+runtime_env = None
+runtime_env_lock = threading.Lock()
 
-        # Prefer highest quality variants when multiple formats match
-        opts['format_sort'] = ['res', 'fps', 'hdr', 'vcodec', 'acodec', 'size']
 
-    # Subtitles - disabled for speed (significantly slows down download)
-    # Uncomment to enable:
-    # if subtitles:
-    #     opts.update({
-    #         'writesubtitles': True,
-    #         'allsubtitles': False,
-    #         'subtitleslangs': ['en', '.*'],
-    #         'writeautomaticsub': True,
-    #     })
-    #     pps.append({
-    #         'key': 'FFmpegEmbedSubtitle',
-    #     })
-    #     add_log("Feature enabled: Download/Embed Subtitles")
+def get_runtime_environment(refresh=False):
+    """Return the cached RuntimeEnvironment, rebuilding it when stale"""
+    global runtime_env
+    with runtime_env_lock:
+        if refresh or runtime_env is None or runtime_env.is_stale():
+            runtime_env = RuntimeEnvironment()
+        return runtime_env
 
-    # Thumbnail - fast embedding as cover art (shows in file properties)
-    if embed_thumbnail:
-        opts.update({
-            'writethumbnail': True,  # Download thumbnail JPG
+
+YOUTUBE_VIDEO_ID_RE = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/live/|/embed/)([0-9A-Za-z_-]{11})')
+YOUTUBE_LIST_ID_RE = re.compile(r'[?&]list=([0-9A-Za-z_-]+)')
+
+
+def metadata_cache_key(url):
+    """Normalize a URL so equivalent YouTube links share one cache entry"""
+    url = url.strip()
+    list_match = YOUTUBE_LIST_ID_RE.search(url)
+    if list_match:
+        return f"youtube:list:{list_match.group(1)}"
+    video_match = YOUTUBE_VIDEO_ID_RE.search(url)
+    if video_match:
+        return f"youtube:{video_match.group(1)}"
+    return url.split('#', 1)[0].rstrip('/')
+
+
+class MetadataCache:
+    """Bounded LRU of extracted info dicts with a freshness TTL
+
+    /api/info stores what it extracted so the download that usually follows
+    can hand it to YoutubeDL.process_ie_result instead of extracting again.
+    Stream URLs expire, so entries older than the TTL are never reused.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()  # key -> (stored_at, info)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return a private copy of a fresh entry, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, info = entry
+            if time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # yt-dlp annotates the dict while processing it
+        return copy.deepcopy(info)
+
+    def peek(self, key, *fields):
+        """Selected top-level fields of a fresh entry (without copying it), or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                return None
+            return {field: entry[1].get(field) for field in fields}
+
+    def put(self, key, info):
+        with self.lock:
+            self.entries[key] = (time.time(), info)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+metadata_cache = MetadataCache(Config.METADATA_CACHE_SIZE, Config.METADATA_CACHE_TTL)
+
+
+def estimated_seconds(info):
+    """Rough size of a download for shortest-job-first: its duration, else its size at ~2 Mbit/s"""
+    if not info:
+        return None
+    if isinstance(info.get('duration'), (int, float)):
+        return float(info['duration'])
+    size = info.get('filesize_approx') or info.get('filesize')
+    if isinstance(size, (int, float)):
+        return size / 250000
+    return None
+
+
+FALLBACK_ALT_CLIENTS = 'alternate player clients'
+FALLBACK_NO_BROWSER_COOKIES = 'no browser cookies'
+
+
+def url_host(url):
+    """Host a fallback is remembered for (youtu.be and m./www. share youtube.com)"""
+    host = (urllib.parse.urlparse(url.strip()).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return 'youtube.com' if host == 'youtu.be' else host
+
+
+class FallbackMemory:
+    """Per-host record of which fallback last got a download through
+
+    Later jobs for the same host start with that fallback applied instead of
+    paying for a failed first attempt. Entries expire so a transient problem
+    (a locked browser, a temporary client outage) does not stick forever.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}  # host -> (remembered_at, fallback)
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url_host(url))
+            if entry is None or time.time() - entry[0] > self.ttl:
+                return None
+            return entry[1]
+
+    def remember(self, url, fallback):
+        with self.lock:
+            self.entries[url_host(url)] = (time.time(), fallback)
+
+
+fallback_memory = FallbackMemory(Config.FALLBACK_MEMORY_TTL)
+
+
+class SQLiteStore:
+    """A single-file SQLite database in WAL mode with one connection per thread
+
+    WAL lets the request threads read while a worker is writing; subclasses
+    provide the SCHEMA statement.
+    """
+
+    SCHEMA = ''
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.schema_lock = threading.Lock()
+        self.schema_ready = False
+
+    def connect(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self.schema_lock:
+                if not self.schema_ready:
+                    conn.executescript(self.SCHEMA)
+                    conn.commit()
+                    self.schema_ready = True
+            self.local.conn = conn
+        return conn
+
+
+class DownloadArchive(SQLiteStore):
+    """SQLite index of finished downloads: (extractor, video id, mode) -> output file
+
+    Consulted before extraction so re-submitted videos, playlists and channel
+    re-syncs skip whatever is already on disk, whichever folder it went to.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS downloads ('
+        ' extractor TEXT NOT NULL, video_id TEXT NOT NULL, mode TEXT NOT NULL,'
+        ' output_path TEXT NOT NULL, format TEXT, filesize INTEGER, title TEXT, url TEXT,'
+        ' downloaded_at REAL NOT NULL,'
+        ' PRIMARY KEY (extractor, video_id, mode)'
+        ') WITHOUT ROWID'
+    )
+
+    def lookup(self, extractor, video_id, mode=None):
+        """Return the archived download if its file still exists, else None"""
+        query = 'SELECT * FROM downloads WHERE extractor = ? AND video_id = ?'
+        params = [extractor.lower(), str(video_id)]
+        if mode:
+            query += ' AND mode = ?'
+            params.append(mode)
+        try:
+            rows = self.connect().execute(query + ' ORDER BY downloaded_at DESC', params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Download archive lookup failed: {e}")
+            return None
+        for row in rows:
+            entry = dict(row)
+            if os.path.exists(entry['output_path']):
+                return entry
+            # Moved or deleted since: let it download again
+            self.forget(entry['extractor'], entry['video_id'], entry['mode'])
+        return None
+
+    def lookup_many(self, keys, mode=None):
+        """lookup() for many (extractor, video id) keys at once: {key: entry} for those archived"""
+        keys = list({(extractor.lower(), str(video_id)) for extractor, video_id in keys})
+        found = {}
+        for start in range(0, len(keys), 400):  # Stay under SQLite's bound-parameter limit
+            chunk = keys[start:start + 400]
+            query = 'SELECT * FROM downloads WHERE (extractor, video_id) IN (VALUES ' + ', '.join(['(?, ?)'] * len(chunk)) + ')'
+            params = [value for key in chunk for value in key]
+            if mode:
+                query += ' AND mode = ?'
+                params.append(mode)
+            try:
+                rows = self.connect().execute(query + ' ORDER BY downloaded_at DESC', params).fetchall()
+            except sqlite3.Error as e:
+                print(f"Download archive lookup failed: {e}")
+                return found
+            for row in rows:
+                entry = dict(row)
+                key = (entry['extractor'], entry['video_id'])
+                if key in found:
+                    continue
+                if os.path.exists(entry['output_path']):
+                    found[key] = entry
+                else:
+                    self.forget(entry['extractor'], entry['video_id'], entry['mode'])
+        return found
+
+    def record(self, extractor, video_id, mode, output_path, format_id='', filesize=0, title='', url=''):
+        """Add or replace the entry for a finished download"""
+        try:
+            conn = self.connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (extractor.lower(), str(video_id), mode, output_path, format_id, filesize, title, url, time.time()),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Download archive update failed: {e}")
+
+    def forget(self, extractor, video_id, mode):
+        try:
+            conn = self.connect()
+            conn.execute(
+                'DELETE FROM downloads WHERE extractor = ? AND video_id = ? AND mode = ?',
+                (extractor, video_id, mode),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Download archive update failed: {e}")
+
+
+download_archive = DownloadArchive(Config.ARCHIVE_FILE)
+
+
+class JobStore(SQLiteStore):
+    """Durable copy of the job registry so queued and interrupted jobs survive a restart
+
+    Rows are written on job creation and whenever a persisted field changes
+    (status, title, counters; not live progress). Callers snapshot the row
+    under status_lock; run() writes it on its own thread, in the order the
+    changes were made, so no SQLite I/O happens while the lock is held.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        ' id TEXT PRIMARY KEY, parent_id TEXT NOT NULL, status TEXT NOT NULL,'
+        ' created_at REAL NOT NULL, updated_at REAL NOT NULL,'
+        ' record TEXT NOT NULL, options TEXT NOT NULL'
+        ')'
+    )
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.pending = queue.Queue()  # Lists of (statement, rows) waiting for run()
+
+    def save(self, job):
+        """Queue an insert or replace of a job's row, serialized as it is now"""
+        record = {key: job[key] for key in DEFAULT_JOB if key != 'logs'}
+        record['fanned_out'] = job.get('_fanned_out', False)
+        try:
+            row = (job['id'], job['parent_id'], job['status'], job['created_at'], time.time(),
+                   json.dumps(record), json.dumps(job['_options']))
+        except (TypeError, ValueError) as e:
+            print(f"Job store update failed for {job['id']}: {e}")
+            return
+        self.queue_write('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)', [row])
+
+    def delete(self, job_ids):
+        self.queue_write('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in job_ids])
+
+    def queue_write(self, statement, rows):
+        group = getattr(self.local, 'group', None)
+        if group is not None:
+            group.append((statement, rows))
+        else:
+            self.pending.put([(statement, rows)])
+
+    @contextlib.contextmanager
+    def grouped(self):
+        """Hand this thread's writes to run() as one unit, committed in a single transaction"""
+        self.local.group = []
+        try:
+            yield
+        finally:
+            group, self.local.group = self.local.group, None
+            if group:
+                self.pending.put(group)
+
+    def flush(self):
+        """Wait until every queued write is on disk"""
+        self.pending.join()
+
+    def run(self):
+        """Writer thread: commit whatever is queued, in order, one transaction at a time"""
+        while True:
+            writes = [self.pending.get()]
+            while True:
+                try:
+                    writes.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            conn = None
+            try:
+                conn = self.connect()
+                for group in writes:
+                    for statement, rows in group:
+                        conn.executemany(statement, rows)
+                conn.commit()
+            except Exception as e:
+                print(f"Job store update failed, {len(writes)} change(s) lost: {e}")
+                if conn is not None:
+                    conn.rollback()
+            finally:
+                for _ in writes:
+                    self.pending.task_done()
+
+    def load(self):
+        """All stored jobs as (record, options), parents before their entries"""
+        try:
+            rows = self.connect().execute(
+                "SELECT status, record, options FROM jobs ORDER BY parent_id != '', created_at"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Job store could not be read: {e}")
+            return []
+        loaded = []
+        for row in rows:
+            record = json.loads(row['record'])
+            record['status'] = row['status']
+            loaded.append((record, json.loads(row['options'])))
+        return loaded
+
+
+job_store = JobStore(Config.JOB_STORE_FILE)
+
+
+class SpillQueue(SQLiteStore):
+    """On-disk overflow of the download queue
+
+    Submissions beyond MAX_QUEUED_JOBS, and playlist/batch entries beyond
+    MAX_QUEUED_ENTRIES, wait here as a URL plus options instead of a full
+    job record; refill_download_queue() turns them into jobs as the
+    in-memory windows drain. They keep the job ID they were given when
+    queued. Changes happen under spill_lock, never under status_lock.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS spilled ('
+        ' seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, parent_id TEXT NOT NULL,'
+        ' url_key TEXT NOT NULL, url TEXT NOT NULL, client TEXT NOT NULL, folder TEXT NOT NULL,'
+        ' options TEXT NOT NULL, created_at REAL NOT NULL'
+        ');'
+        'CREATE INDEX IF NOT EXISTS spilled_client ON spilled (client, seq);'
+        'CREATE INDEX IF NOT EXISTS spilled_parent ON spilled (parent_id, seq);'
+        'CREATE INDEX IF NOT EXISTS spilled_url ON spilled (url_key)'
+    )
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.count_lock = threading.Lock()
+        self.counts = None  # {is entry: rows on disk}, counted once then kept up to date
+
+    def size(self, entries=None):
+        """Spilled jobs: all of them, only entries (True) or only submissions (False)"""
+        with self.count_lock:
+            if self.counts is None:
+                try:
+                    rows = self.connect().execute(
+                        "SELECT parent_id != '' AS entry, COUNT(*) AS count FROM spilled GROUP BY entry"
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    print(f"Spill queue could not be read: {e}")
+                    return 0
+                self.counts = {False: 0, True: 0}
+                self.counts.update((bool(row['entry']), row['count']) for row in rows)
+            if entries is None:
+                return self.counts[False] + self.counts[True]
+            return self.counts[entries]
+
+    def adjust(self, removed):
+        """Update the counts for a {parent ID: rows} change (negative when removed)"""
+        self.size()
+        with self.count_lock:
+            if self.counts is not None:
+                for parent_id, delta in removed.items():
+                    entry = bool(parent_id)
+                    self.counts[entry] = max(0, self.counts[entry] + delta)
+
+    def push(self, job_id, url, options, parent_id=''):
+        """Append one job; returns how many spilled jobs of the same parent (or submissions) are ahead of it"""
+        self.push_many([(job_id, url, options, parent_id)])
+        row = self.connect().execute(
+            'SELECT COUNT(*) FROM spilled WHERE parent_id = ? AND seq < (SELECT seq FROM spilled WHERE id = ?)',
+            (parent_id, job_id),
+        ).fetchone()
+        return row[0]
+
+    def push_many(self, rows):
+        """Append (job ID, url, options, parent ID) rows in one transaction"""
+        conn = self.connect()
+        now = time.time()
+        conn.executemany(
+            'INSERT INTO spilled (id, parent_id, url_key, url, client, folder, options, created_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(job_id, parent_id, metadata_cache_key(url), url, options.get('client') or '',
+              os.path.abspath(options['folder']), json.dumps(options), now)
+             for job_id, url, options, parent_id in rows],
+        )
+        conn.commit()
+        self.adjust(collections.Counter(parent_id for _, _, _, parent_id in rows))
+
+    def contains(self, url):
+        """True if the URL (or an equivalent form of it) is waiting here"""
+        row = self.connect().execute('SELECT 1 FROM spilled WHERE url_key = ? LIMIT 1', (metadata_cache_key(url),)).fetchone()
+        return row is not None
+
+    def contains_many(self, url_keys):
+        """The normalized URLs (see metadata_cache_key) of `url_keys` that are waiting here"""
+        url_keys = list(set(url_keys))
+        found = set()
+        for start in range(0, len(url_keys), 400):
+            chunk = url_keys[start:start + 400]
+            rows = self.connect().execute(
+                'SELECT url_key FROM spilled WHERE url_key IN (' + ', '.join('?' * len(chunk)) + ')', chunk,
+            ).fetchall()
+            found.update(row['url_key'] for row in rows)
+        return found
+
+    def get(self, job_id):
+        """A spilled job as a dict with its `position` among its parent's (or the submissions') spilled jobs, or None"""
+        conn = self.connect()
+        row = conn.execute('SELECT * FROM spilled WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['position'] = conn.execute(
+            'SELECT COUNT(*) FROM spilled WHERE parent_id = ? AND seq < ?', (entry['parent_id'], entry['seq']),
+        ).fetchone()[0]
+        return entry
+
+    def pop(self, running, entries=False):
+        """Remove and return the next submission (or entry) to admit, or None
+
+        Like the scheduler's fair share: the oldest one of the client with
+        the fewest jobs in `running` (a Counter of queued and running jobs
+        per client), so one client's backlog doesn't hold up others.
+        """
+        conn = self.connect()
+        heads = conn.execute(
+            "SELECT client, MIN(seq) AS seq FROM spilled WHERE (parent_id != '') = ? GROUP BY client", (entries,),
+        ).fetchall()
+        if not heads:
+            return None
+        head = min(heads, key=lambda row: (running.get(row['client'], 0), row['seq']))
+        row = conn.execute('SELECT * FROM spilled WHERE seq = ?', (head['seq'],)).fetchone()
+        if row is None or conn.execute('DELETE FROM spilled WHERE seq = ?', (head['seq'],)).rowcount != 1:
+            return None  # Cancelled meanwhile
+        conn.commit()
+        self.adjust({row['parent_id']: -1})
+        return dict(row)
+
+    def counts_by_parent(self):
+        """{parent ID: spilled entries} for every parent with entries on disk"""
+        try:
+            rows = self.connect().execute(
+                "SELECT parent_id, COUNT(*) AS count FROM spilled WHERE parent_id != '' GROUP BY parent_id"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Spill queue could not be read: {e}")
+            return {}
+        return {row['parent_id']: row['count'] for row in rows}
+
+    def remove(self, job_id):
+        """Drop one spilled job; returns its row, or None if it isn't here"""
+        try:
+            conn = self.connect()
+            row = conn.execute('SELECT * FROM spilled WHERE id = ?', (job_id,)).fetchone()
+            if row is None or conn.execute('DELETE FROM spilled WHERE id = ?', (job_id,)).rowcount != 1:
+                return None
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Spill queue update failed: {e}")
+            return None
+        self.adjust({row['parent_id']: -1})
+        return dict(row)
+
+    def clear(self, folder=None, parent_id=None):
+        """Drop spilled jobs (saving into `folder` or below, of one parent); returns {parent ID: removed}"""
+        where, params = [], []
+        if folder:
+            where.append('(folder = ? OR substr(folder, 1, ?) = ?)')
+            params += [folder, len(folder) + 1, folder + os.sep]
+        if parent_id is not None:
+            where.append('parent_id = ?')
+            params.append(parent_id)
+        condition = ' WHERE ' + ' AND '.join(where) if where else ''
+        try:
+            conn = self.connect()
+            rows = conn.execute(f'SELECT parent_id, COUNT(*) AS count FROM spilled{condition} GROUP BY parent_id', params).fetchall()
+            conn.execute(f'DELETE FROM spilled{condition}', params)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Spill queue update failed: {e}")
+            return collections.Counter()
+        removed = collections.Counter({row['parent_id']: row['count'] for row in rows})
+        self.adjust({parent_id: -count for parent_id, count in removed.items()})
+        return removed
+
+
+download_spill = SpillQueue(Config.SPILL_QUEUE_FILE)
+
+# Fields worth a write to the job store when they change (live progress is not)
+PERSISTED_JOB_FIELDS = frozenset((
+    'status', 'title', 'output_folder', 'playlist_total', 'playlist_completed', 'playlist_failed',
+    'filename', 'downloaded_bytes', 'started_at', 'finished_at',
+))
+
+
+@functools.lru_cache(maxsize=1024)
+def archive_key_for_url(url, scan_extractors=True):
+    """(extractor, video id) of a single-video URL without extracting it, or None
+
+    Other sites than YouTube take a scan over yt-dlp's extractors (several
+    ms per URL); `scan_extractors=False` skips them.
+    """
+    if YOUTUBE_LIST_ID_RE.search(url):
+        return None  # yt-dlp downloads the whole list for these
+    video_match = YOUTUBE_VIDEO_ID_RE.search(url)
+    if video_match:
+        return ('youtube', video_match.group(1))
+    if not scan_extractors:
+        return None
+    # Same pre-extraction check yt-dlp uses for --download-archive
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.ie_key() != 'Generic' and ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            return (ie.ie_key().lower(), video_id) if video_id else None
+    return None
+
+
+def archive_key_for_entry(entry):
+    """(extractor, video id) of a flat playlist entry, or None"""
+    if entry.get('ie_key') and entry.get('id'):
+        return (entry['ie_key'].lower(), entry['id'])
+    entry_url = playlist_entry_url(entry)
+    return archive_key_for_url(entry_url) if entry_url else None
+
+
+def archive_match_filter(mode, info_dict, incomplete=False):
+    """yt-dlp match_filter that skips entries already in the download archive"""
+    if info_dict.get('_type', 'video') == 'playlist':
+        return None
+    key = archive_key_for_entry(info_dict)
+    if key and download_archive.lookup(*key, mode):
+        return f"{info_dict.get('title') or key[1]} is already in the download archive"
+    return None
+
+
+def output_files(info):
+    """(path, size) of each final file yt-dlp reports for a download, one stat() per file
+
+    Covers every entry of a playlist; reported paths that don't exist are left out.
+    """
+    if info.get('_type') == 'playlist':
+        return [file for entry in info.get('entries') or [] if entry for file in output_files(entry)]
+    files = []
+    for download in info.get('requested_downloads') or []:
+        filepath = download.get('filepath')
+        if not filepath:
+            continue
+        try:
+            files.append((filepath, os.stat(filepath).st_size))
+        except OSError:
+            continue
+    return files
+
+
+def archive_downloaded(info, mode, url=''):
+    """Record a finished download (or each entry of a downloaded playlist) in the archive"""
+    if info.get('_type') == 'playlist':
+        for entry in info.get('entries') or []:
+            if entry:
+                archive_downloaded(entry, mode)
+        return
+    for download in info.get('requested_downloads') or []:
+        filepath = download.get('filepath')
+        if filepath and os.path.exists(filepath) and info.get('extractor_key') and info.get('id'):
+            download_archive.record(
+                info['extractor_key'],
+                info['id'],
+                mode,
+                os.path.abspath(filepath),
+                download.get('format_id') or info.get('format_id') or '',
+                os.path.getsize(filepath),
+                info.get('title') or '',
+                info.get('webpage_url') or url,
+            )
+            return
+
+
+def apply_fallback_options(opts, fallback, job=None):
+    """Return an overlay copy of opts with a fallback applied"""
+    fallback_opts = dict(opts)
+    if fallback == FALLBACK_NO_BROWSER_COOKIES:
+        fallback_opts.pop('cookiesfrombrowser', None)
+    elif fallback == FALLBACK_ALT_CLIENTS:
+        fallback_opts['extractor_args'] = build_youtube_extractor_args(
+            allow_fallback_clients=True,
+            job=job
+        )
+        node_path = get_runtime_environment().system_node_path
+        if not Config.USE_NODE_RUNTIME and node_path:
+            fallback_opts['js_runtimes'] = {
+                'node': {
+                    'path': node_path
+                }
+            }
+    return fallback_opts
+
+
+def retry_with_alternate_clients(ydl, url, raw_info, alt_opts, job=None):
+    """Retry a format failure on the same YoutubeDL, querying only new clients
+
+    Reusing the instance keeps its extractors' player JS and signature caches,
+    and for single videos the formats already extracted by the first attempt
+    are merged with those of the alternate clients instead of fetched again.
+    """
+    primary_args = (ydl.params.get('extractor_args') or {}).get('youtube') or {}
+    alt_args = copy.deepcopy(alt_opts['extractor_args'])
+    youtube_args = alt_args['youtube']
+    new_clients = [
+        client for client in youtube_args['player_client']
+        if client not in (primary_args.get('player_client') or [])
+    ]
+    if new_clients:
+        youtube_args['player_client'] = new_clients
+    ydl.params['extractor_args'] = alt_args
+
+    if not raw_info or 'entries' in raw_info or not raw_info.get('formats'):
+        # Playlists consume their lazy entries while processing, so extract again
+        return ydl.extract_info(url, download=True)
+
+    alt_info = ydl.extract_info(url, download=False, process=False)
+    alt_formats = alt_info.get('formats') or []
+    alt_ids = {fmt.get('format_id') for fmt in alt_formats}
+    merged_info = dict(alt_info)
+    merged_info['formats'] = alt_formats + [
+        fmt for fmt in raw_info['formats'] if fmt.get('format_id') not in alt_ids
+    ]
+    add_log(f"Merged {len(alt_formats)} formats from alternate clients with the first attempt", job)
+    return ydl.process_ie_result(merged_info, download=True)
+
+
+def build_youtube_extractor_args(allow_fallback_clients=False, job=None):
+    """Return a copy of the cached YouTube extractor args, logging disabled clients."""
+    env = get_runtime_environment()
+    if allow_fallback_clients:
+        extractor_args, notes = env.fallback_extractor_args, env.fallback_extractor_notes
+    else:
+        extractor_args, notes = env.extractor_args, env.extractor_notes
+    for note in notes:
+        add_log(note, job)
+    return copy.deepcopy(extractor_args)
+
+
+def get_ydl_opts(folder, mode, resolution, subtitles=False, embed_thumbnail=False, job=None):
+    """Build yt-dlp options based on user settings"""
+    env = get_runtime_environment()
+
+    if env.ffmpeg_location:
+        add_log(f"Using local FFmpeg from: {env.ffmpeg_location}", job)
+    elif not env.ffmpeg_available:
+        add_log("⚠️ Warning: FFmpeg not found! Audio extraction and video merging will fail.", job)
+    for note in env.extractor_notes:
+        add_log(note, job)
+
+    # Shallow copy: yt-dlp rewrites top-level params in place
+    opts = dict(env.base_ydl_opts)
+    opts['outtmpl'] = {
+        'default': os.path.join(folder, '%(title)s [%(id)s].%(ext)s'),
+        'playlist': os.path.join(folder, '%(playlist)s', '%(playlist_index)s - %(title)s [%(id)s].%(ext)s'),
+    }
+    opts['concurrent_fragment_downloads'] = concurrency.fragments
+    opts['progress_hooks'] = [functools.partial(progress_hook, job)]
+    opts['postprocessor_hooks'] = [functools.partial(postprocessor_hook, job)]
+    opts['logger'] = YtdlpLogger(job)
+
+    if env.cookiefile:
+        add_log(f"Using cookies file: {env.cookiefile}", job)
+    elif env.cookies_from_browser:
+        add_log(f"Using cookies from browser: {env.cookies_from_browser}", job)
+
+    if Config.USE_NODE_RUNTIME and not env.node_path:
+        add_log("⚠️ Warning: Node.js runtime not found. Some YouTube formats may be missing.", job)
+    
+    # Post-processors list
+    pps = []
+
+    if mode == "Audio":
+        # Audio-only mode: extract best audio as MP3
+        opts.update({
+            'format': 'bestaudio/best',
+        })
+        pps.append({
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '320',
+        })
+        add_log(f"Mode: Audio extraction (MP3 320kbps)", job)
+    else:
+        # Video mode with resolution selection
+        if resolution == "Best":
+            # Default to highest possible quality
+            fmt = 'bestvideo*+bestaudio/best'
+        else:
+            try:
+                height = int(resolution.split('p')[0])
+                fmt = f'bestvideo*[height<={height}]+bestaudio/best[height<={height}]/best'
+            except Exception:
+                fmt = 'bestvideo*+bestaudio/best'
+
+        opts.update({
+            'format': fmt,
+            'merge_output_format': 'mkv',
+            'prefer_ffmpeg': True,
+        })
+
+        # Prefer highest quality variants when multiple formats match
+        opts['format_sort'] = ['res', 'fps', 'hdr', 'vcodec', 'acodec', 'size']
+
+    # Subtitles - disabled for speed (significantly slows down download)
+    # Uncomment to enable:
+    # if subtitles:
+    #     opts.update({
+    #         'writesubtitles': True,
+    #         'allsubtitles': False,
+    #         'subtitleslangs': ['en', '.*'],
+    #         'writeautomaticsub': True,
+    #     })
+    #     pps.append({
+    #         'key': 'FFmpegEmbedSubtitle',
+    #     })
+    #     add_log("Feature enabled: Download/Embed Subtitles", job)
+
+    # Thumbnail - fast embedding as cover art (shows in file properties)
+    if embed_thumbnail:
+        opts.update({
+            'writethumbnail': True,  # Download thumbnail JPG
         })
         # Embed as cover art metadata in audio files
         if mode == "Audio":
             pps.append({
                 'key': 'FFmpegMetadata',  # Embeds thumbnail as cover art
             })
-            add_log("Feature enabled: Thumbnail as album art")
+            add_log("Feature enabled: Thumbnail as album art", job)
         else:
             # For video, FFmpegMetadata attaches thumbnail as cover art (Windows shows this)
             pps.append({
                 'key': 'FFmpegMetadata',  # Fast metadata-only embedding
             })
-            add_log("Feature enabled: Thumbnail embedded (shows in file explorer)")
+            add_log("Feature enabled: Thumbnail embedded (shows in file explorer)", job)
 
     if pps:
         opts['postprocessors'] = pps
@@ -466,120 +1997,705 @@ def build_po_tokens():
     return tokens
 
 
+PLAYLIST_IE_KEYS = ('YoutubeTab', 'YoutubePlaylist')
+
+
+def playlist_entry_url(entry):
+    """URL to queue for one entry of a flat playlist"""
+    if entry.get('_type', 'video') == 'video':
+        return entry.get('webpage_url') or entry.get('url')
+    return entry.get('url')
+
+
+def is_nested_playlist(entry):
+    """True for an entry that is itself a YouTube tab/playlist link"""
+    return entry.get('_type') in ('url', 'url_transparent') and entry.get('ie_key') in PLAYLIST_IE_KEYS
+
+
+def iter_playlist_entries(ydl, info, depth=0):
+    """Yield the video entries of an unprocessed playlist result as they are paged in
+
+    Entries come straight from the extractor's (lazy) entry list and are not
+    kept once yielded. Nested playlists and tab links, e.g. a channel's
+    Videos/Shorts/Live tabs, are expanded up to two levels deep.
+    """
+    if depth < 2 and is_nested_playlist(info):
+        info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info['ie_key'])
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        if depth < 2 and (entry.get('_type') == 'playlist' or is_nested_playlist(entry)):
+            yield from iter_playlist_entries(ydl, entry, depth + 1)
+        else:
+            yield entry
+
+
+def fan_out_playlist_job(job, worker_id):
+    """Split a playlist/channel job into per-entry jobs on the shared queue
+
+    Entries are queued while the listing is still being paged in, so workers
+    start on the first videos right away and no full playlist is ever held in
+    memory. The parent only waits; update_parent_progress() finishes it when
+    the last entry is done.
+    """
+    options = job['_options']
+    limit = None
+    if options['download_type'] == 'channel' and options['channel_mode'] == 'recent':
+        limit = options['video_count']
+
+    add_log("Expanding playlist entries...", job)
+    update_job(job, current_action='Listing playlist entries...')
+    flat_opts = dict(get_runtime_environment().base_ydl_opts)
+    flat_opts.update({
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'logger': YtdlpLogger(job),
+    })
+    # Keep entry logs short: a channel can fan out into thousands of jobs
+    entry_log_limit = min(options.get('log_limit') or Config.JOB_LOG_LIMIT, Config.PLAYLIST_ENTRY_LOG_LIMIT)
+
+    check_archive = Config.ARCHIVE_ENABLED and not options.get('force')
+    job['_expanding'] = True
+    count = 0
+    skipped = 0
+    try:
+        with yt_dlp.YoutubeDL(flat_opts) as ydl:  # type: ignore[arg-type]
+            # A flat playlist previewed via /api/info can be reused as is
+            info = metadata_cache.get(metadata_cache_key(job['url']))
+            if info is None or 'entries' not in info:
+                with job_span(job, 'extraction', 'playlist listing'):
+                    info = ydl.extract_info(job['url'], download=False, process=False)
+            playlist_title = info.get('title') or info.get('id') or 'Playlist'
+            entry_folder = os.path.join(options['folder'], yt_dlp.utils.sanitize_filename(playlist_title))
+            index_width = max(len(str(limit or info.get('playlist_count') or 0)), 3)
+            update_job(job, title=playlist_title, output_folder=entry_folder, status='downloading')
+
+            try:
+                # Entries keep their listing position, so skipped ones leave a gap
+                # in the numbering rather than shifting every later file name
+                for position, entry in enumerate(iter_playlist_entries(ydl, info), 1):
+                    if job['_cancel'].is_set():
+                        add_log("Cancelled while listing entries", job)
+                        break
+                    entry_url = playlist_entry_url(entry)
+                    if not entry_url:
+                        continue
+                    archive_key = archive_key_for_entry(entry) if check_archive else None
+                    if archive_key and download_archive.lookup(*archive_key, options['mode']):
+                        skipped += 1
+                        if limit:
+                            # Uploads are newest first: everything after this is older
+                            add_log(f"Reached an already downloaded video after {count} new entries", job)
+                            break
+                        continue
+                    count += 1
+                    admit_entry(job, entry_url, {
+                        **options,
+                        'download_type': 'single',
+                        'folder': entry_folder,
+                        'log_limit': entry_log_limit,
+                        'playlist_index': position,
+                        'entry_title': entry.get('title') or '',
+                        'estimate': estimated_seconds(entry),
+                        # Same layout as yt-dlp's playlist template: "<index> - <title> [<id>]"
+                        'filename_prefix': f"{position:0{index_width}d} - ",
+                    })
+                    if count % 50 == 0:
+                        update_job(job, playlist_total=count, current_action=f'Listing playlist entries ({count} queued)...')
+                    if limit and count >= limit:
+                        break
+            except Exception as e:
+                if not count:
+                    raise
+                # Keep what was listed so far rather than failing the queued entries
+                add_log(f"Listing stopped early after {count} entries: {e}", job)
+            info = None
+    finally:
+        job['_expanding'] = False
+        if count:
+            # A restart now resumes the queued entries instead of listing again
+            job['_fanned_out'] = True
+            if Config.PERSIST_JOBS:
+                with status_lock:
+                    job_store.save(job)
+
+    if skipped:
+        add_log(f"Skipped {skipped} already downloaded entries", job)
+    if not count:
+        if job['_cancel'].is_set():
+            raise Exception("Cancelled by user")
+        if skipped:
+            update_job(job, status='completed', progress=100, current_action='Already downloaded')
+            return
+        raise Exception("No downloadable entries found in this playlist/channel")
+
+    print(f"[Worker {worker_id}] Fanned out {count} entries from {job['url']}")
+    add_log(f"Queued {count} entries from: {playlist_title}", job)
+    # Entries may all have finished while the listing was still running
+    update_parent_progress(job)
+
+
+def update_parent_progress(parent):
+    """Aggregate a playlist parent's counters from its entries; finish it when all are done"""
+    with status_lock:
+        children = parent['_children']
+        # Entries still in the spill queue are pending; spilled ones cancelled there count as cancelled
+        total = len(children) + parent['_spilled'] + parent['_dropped_entries']
+        completed = sum(1 for child in children if child['status'] == 'completed')
+        cancelled = sum(1 for child in children if child['status'] == 'cancelled') + parent['_dropped_entries']
+        failed = sum(1 for child in children if child['status'] == 'error')
+        done = completed + cancelled + failed
+        updates = {
+            'playlist_total': total,
+            'playlist_completed': completed,
+            'playlist_failed': failed + cancelled,
+            'progress': (done * 100.0 / total) if total else 0,
+        }
+        if parent['status'] in FINISHED_JOB_STATES and done < total:
+            # Entries were requeued by a retry
+            updates['status'] = 'downloading'
+            updates['finished_at'] = 0
+            parent['_cancel'].clear()
+            active_downloads_urls.add(parent['url'])
+        if done < total or parent.get('_expanding'):
+            updates['current_action'] = f'Downloaded {completed}/{total} entries'
+            if failed + cancelled:
+                updates['current_action'] += f' ({failed + cancelled} failed)'
+        elif parent['status'] not in FINISHED_JOB_STATES:
+            if failed:
+                updates['status'] = 'error'
+                updates['current_action'] = f'{failed + cancelled} of {total} entries failed'
+            elif cancelled:
+                updates['status'] = 'cancelled'
+                updates['current_action'] = 'Cancelled'
+            else:
+                updates['status'] = 'completed'
+                updates['current_action'] = 'Complete!'
+            updates['finished_at'] = time.time()
+            active_downloads_urls.discard(parent['url'])
+        update_job(parent, **updates)
+        if updates.get('finished_at'):
+            kind = 'Batch' if parent['download_type'] == 'batch' else 'Playlist'
+            add_log(f"{kind} finished: {completed}/{total} entries downloaded", parent)
+            prune_jobs()
+
+
+def requeue_job(job):
+    """Reset a finished job and put it back on the queue"""
+    with status_lock:
+        update_job(
+            job,
+            status='queued',
+            progress=0,
+            speed='',
+            eta='',
+            current_action='Queued for retry',
+            started_at=0,
+            finished_at=0,
+        )
+        queued_urls.add(job['url'])
+        job['_cancel'].clear()
+        job['_bytes_seen'] = 0
+        job['_open_spans'].clear()
+        begin_span(job, 'queue', 'retry queue')
+    metrics.inc('job_retries_total')
+    download_queue.put(job['id'])
+
+
+def queued_submissions():
+    """Submitted jobs waiting in memory for a worker (playlist entries don't count)"""
+    with status_lock:
+        return sum(1 for job in top_level_jobs() if job['status'] == 'queued')
+
+
+def estimated_start(position):
+    """(seconds, timestamp) until a job with `position` jobs ahead of it starts, or (None, None)
+
+    Throughput is the worker pool size over the mean run time of recently
+    finished jobs; there is no estimate until a job has finished.
+    """
+    with status_lock:
+        durations = list(recent_job_seconds)
+        workers = max(1, download_worker_target)
+    if not durations:
+        return None, None
+    per_second = workers / max(0.1, sum(durations) / len(durations))
+    wait = round(position / per_second)
+    return wait, time.time() + wait
+
+
+def admit_job(url, options):
+    """Queue a new submission: in memory while the window has room, else on disk
+
+    The caller has reserved `url` in queued_urls. Returns (job ID, position,
+    spilled). Once a submission has spilled, new ones spill too so they
+    can't overtake it. Raises queue.Full when the spill queue is full as
+    well (or disabled).
+    """
+    with status_lock:
+        if not download_spill.size(entries=False) and queued_submissions() < MAX_QUEUED_JOBS:
+            position = download_queue.qsize(entries=False)
+            job = create_job(url, options)
+            download_queue.put(job['id'])
+            return job['id'], position, False
+    with spill_lock:
+        if download_spill.size() >= Config.MAX_SPILLED_JOBS:
+            raise queue.Full
+        job_id = uuid.uuid4().hex[:12]
+        ahead = download_spill.push(job_id, url, options)
+    metrics.inc('jobs_spilled_total')
+    return job_id, download_queue.qsize(entries=False) + ahead, True
+
+
+def admit_entry(parent, url, options):
+    """Queue a playlist/batch entry: in memory while MAX_QUEUED_ENTRIES allows, else on disk
+
+    Returns the entry's job ID. Once one of the parent's entries has
+    spilled the rest follow, so they still start in order.
+    """
+    with status_lock:
+        in_memory = Config.MAX_SPILLED_JOBS <= 0 or (
+            not parent['_spilled'] and download_queue.qsize(entries=True) < Config.MAX_QUEUED_ENTRIES
+        )
+        if in_memory:
+            child = create_job(url, options, parent=parent)
+            queued_urls.add(url)
+    if in_memory:
+        download_queue.put(child['id'])
+        return child['id']
+    job_id = uuid.uuid4().hex[:12]
+    with spill_lock:
+        download_spill.push(job_id, url, options, parent['id'])
+        with status_lock:
+            parent['_spilled'] += 1
+    metrics.inc('jobs_spilled_total')
+    return job_id
+
+
+def drop_spilled_entries(removed):
+    """Count entries removed from the spill queue as cancelled on their parents
+
+    `removed` is {parent ID: count} as returned by SpillQueue.clear(); the
+    caller holds spill_lock.
+    """
+    parents = []
+    with status_lock:
+        for parent_id, count in removed.items():
+            parent = jobs.get(parent_id) if parent_id else None
+            if parent is not None:
+                parent['_spilled'] = max(0, parent['_spilled'] - count)
+                parent['_dropped_entries'] += count
+                parents.append(parent)
+    for parent in parents:
+        update_parent_progress(parent)
+
+
+def refill_download_queue():
+    """Move spilled submissions and entries into memory while their windows have room"""
+    if not download_spill.size() or not spill_lock.acquire(blocking=False):
+        return
+    try:
+        for entries in (False, True):
+            while download_spill.size(entries):
+                with status_lock:
+                    if entries:
+                        full = download_queue.qsize(entries=True) >= Config.MAX_QUEUED_ENTRIES
+                    else:
+                        full = queued_submissions() >= MAX_QUEUED_JOBS
+                    if full:
+                        break
+                    waiting = collections.Counter(
+                        job['_options'].get('client') or '' for job in jobs.values()
+                        if bool(job['parent_id']) == entries and (job['status'] == 'queued' or is_working(job))
+                    )
+                row = download_spill.pop(waiting, entries)
+                if row is None:
+                    break
+                with status_lock:
+                    parent = jobs.get(row['parent_id']) if row['parent_id'] else None
+                    if parent is not None:
+                        parent['_spilled'] = max(0, parent['_spilled'] - 1)
+                        if parent['_cancel'].is_set() or parent['status'] in FINISHED_JOB_STATES:
+                            parent['_dropped_entries'] += 1
+                            parent = None
+                    if row['parent_id'] and parent is None:
+                        continue  # Its batch/playlist was pruned or cancelled meanwhile
+                    job = create_job(row['url'], json.loads(row['options']), parent=parent,
+                                     record={'id': row['id'], 'created_at': row['created_at']})
+                    queued_urls.add(job['url'])
+                download_queue.put(job['id'])
+    except sqlite3.Error as e:
+        print(f"Spill queue refill failed: {e}")
+    finally:
+        spill_lock.release()
+
+
+def cancel_job(job):
+    """Cancel one job: a queued job is dropped, a running one is stopped
+
+    The job's token makes the progress/post-processor hooks abort, and any
+    ffmpeg process it started is killed. A playlist/channel job cancels its
+    entries. Returns True if anything was still queued or running.
+    """
+    with status_lock:
+        if job['status'] in FINISHED_JOB_STATES:
+            return False
+        job['_cancel'].set()
+        if job['status'] == 'queued':
+            # The worker skips it when it comes off the queue
+            queued_urls.discard(job['url'])
+            update_job(job, status='cancelled', current_action='Cancelled', finished_at=time.time())
+        else:
+            update_job(job, current_action='Cancelling...')
+        processes = list(job['_processes'])
+        children = list(job['_children'])
+        parent = jobs.get(job['parent_id']) if job['parent_id'] else None
+    if job['_spilled']:
+        with spill_lock:
+            drop_spilled_entries(download_spill.clear(parent_id=job['id']))
+    for process in processes:
+        if process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+    for child in children:
+        cancel_job(child)
+    if children:
+        update_parent_progress(job)
+    elif parent is not None and job['status'] == 'cancelled':
+        update_parent_progress(parent)
+    add_log("Cancel requested", job)
+    return True
+
+
+def complete_download(job, info, label):
+    """Verify a finished download, tidy up and mark the job completed"""
+    mode = job['mode']
+
+    # Update status to show finalization
+    update_job(job, progress=97, current_action='Verifying downloaded files...', status='finalizing')
+    
+    # Check the files yt-dlp reports writing, rather than scanning the folder
+    print(f"[{label}] Verifying output files...")
+    with job_span(job, 'verify'):
+        files = output_files(info)
+    for path, _ in files[:1]:
+        print(f"[{label}] ✓ Media file found: {path}")
+        add_log(f"✓ Media file found: {os.path.basename(path)}", job)
+    if len(files) > 1:
+        add_log(f"✓ {len(files)} media files written", job)
+
+    if not files and info.get('_type') != 'playlist':
+        # (A playlist without new files had every entry skipped by the archive)
+        raise Exception("Download finished but no media output file was found")
+
+    # Update progress before cleanup
+    update_job(job, progress=98, current_action='Cleaning up temporary files...')
+    
+    # Clean up intermediate files (thumbnails, etc)
+    print(f"[{label}] Starting cleanup...")
+    add_log("Cleaning up intermediate files...", job)
+    with job_span(job, 'cleanup'):
+        cleanup_intermediate_files(job, keep=[path for path, _ in files])
+    print(f"[{label}] Cleanup complete")
+    
+    # Keep only a compact summary of the info dict
+    summary = {}
+    if files:
+        summary['filename'] = os.path.basename(files[0][0])
+        summary['downloaded_bytes'] = sum(size for _, size in files)
+    if Config.ARCHIVE_ENABLED:
+        archive_downloaded(info, mode, job['url'])
+
+    # Mark as completed
+    with status_lock:
+        update_job(job, status='completed', progress=100, current_action='Complete!', eta='', speed='', **summary)
+        if job.get('playlist_total', 0) > 0:
+            update_job(job, playlist_completed=job.get('playlist_total', 0))
+    
+    print(f"[{label}] ✓ Download completed successfully!")
+    add_log("✓ Download completed successfully!", job)
+
+
+def fail_job(job, error, label):
+    """Mark a job as failed (or cancelled) and log why"""
+    error_msg = str(error)
+    cancelled = job['_cancel'].is_set() or 'Cancelled by user' in error_msg
+    if cancelled:
+        update_job(job, status='cancelled', current_action='Cancelled')
+    else:
+        # Don't reset progress to 0 - keep it at current value
+        update_job(job, status='error', current_action='Error occurred')
+    
+    if not cancelled:
+        concurrency.record_error(error_msg)
+    if cancelled:
+        print(f"[{label}] ✗ Cancelled")
+        add_log("✗ Cancelled by user", job)
+    else:
+        print(f"[{label}] ✗ Error: {error_msg}")
+        add_log(f"✗ Error: {error_msg}", job)
+    if 'Requested format is not available' in error_msg or 'Only images are available' in error_msg:
+        add_log("Hint: This video may require a YouTube PO token or JS runtime. Try setting PO tokens in config.py or enabling Node.js runtime.", job)
+    
+    # Print full traceback to terminal for debugging
+    import traceback
+    print(f"[{label}] Full traceback:")
+    traceback.print_exc()
+
+
+def finish_job(job):
+    """Release a job that reached a final state and update its playlist parent
+
+    A fanned-out parent, or a job handed to the post-processing pool, stays
+    active until its entries / post-processing are done.
+    """
+    with status_lock:
+        if job['status'] in FINISHED_JOB_STATES:
+            job['_processes'].clear()
+            active_downloads_urls.discard(job['url'])  # Remove URL from active set
+            update_job(job, finished_at=time.time())
+            prune_jobs()
+        parent = jobs.get(job['parent_id']) if job['parent_id'] else None
+    if parent is not None:
+        update_parent_progress(parent)
+
+
+def submit_postprocessing(job, info, pp_specs):
+    """Queue a downloaded job's FFmpeg post-processing on the post-processing pool"""
+    update_job(
+        job,
+        status='processing',
+        current_action='Waiting for post-processing...',
+        speed='',
+        eta='',
+        last_progress_at=time.time(),
+    )
+    add_log("Download finished, queued for post-processing", job)
+    begin_span(job, 'postprocess_queue')
+    postprocess_queue.put((job['id'], info, pp_specs))
+
+
+def run_postprocessors(job, info, pp_specs):
+    """Run the post-processors the download stage skipped on each downloaded file"""
+    opts = dict(get_runtime_environment().base_ydl_opts)
+    opts.update({
+        'postprocessors': pp_specs,
+        'postprocessor_hooks': [functools.partial(postprocessor_hook, job)],
+        'logger': YtdlpLogger(job),
+    })
+    update_job(job, status='processing', current_action='Post-processing...', last_progress_at=time.time())
+    with yt_dlp.YoutubeDL(opts) as ydl:  # type: ignore[arg-type]
+        downloads = info.get('requested_downloads') or []
+        for index, download in enumerate(downloads):
+            if not download.get('filepath'):
+                continue
+            # The merger and fixups already ran in the download stage
+            download.pop('__postprocessors', None)
+            downloads[index] = ydl.post_process(download['filepath'], download)
+
+
+def postprocess_worker(worker_id):
+    """Background worker thread running FFmpeg post-processing for finished downloads"""
+    label = f"Post-processor {worker_id}"
+    print(f"[{label}] Post-processing thread is running...")
+    while True:
+        job_id, info, pp_specs = postprocess_queue.get()
+        with status_lock:
+            job = jobs.get(job_id)
+        if job is None:
+            postprocess_queue.task_done()
+            continue
+        worker_context.job = job
+        end_span(job, 'postprocess_queue')
+        try:
+            if job['_cancel'].is_set():
+                raise DownloadError("Cancelled by user")
+            print(f"[{label}] Post-processing job {job_id}")
+            run_postprocessors(job, info, pp_specs)
+            complete_download(job, info, label)
+        except Exception as e:
+            fail_job(job, e, label)
+        finally:
+            worker_context.job = None
+            info = None
+            finish_job(job)
+            postprocess_queue.task_done()
+
+
 def download_worker(worker_id):
     """Background worker thread for processing downloads"""
+    global busy_download_workers
     print(f"[Worker {worker_id}] Download worker thread is running...")
     while True:
+        with status_lock:
+            if worker_id > download_worker_target:
+                # The pool was shrunk: retire between jobs
+                worker_threads[worker_id - 1] = None
+                print(f"[Worker {worker_id}] Retired (pool size {download_worker_target})")
+                return
         try:
+            refill_download_queue()
             # Wait for a download task
             task = download_queue.get(timeout=1)  # Use timeout to keep thread responsive
             if task is None:  # Poison pill to stop the worker
                 print(f"[Worker {worker_id}] Stopping worker thread")
                 break
             
-            print(f"[Worker {worker_id}] Received task: {task[0]}")
-            # Unpack task with new parameters, with defaults for backward compatibility
-            url = task[0]
-            folder = task[1]
-            mode = task[2]
-            resolution = task[3]
-            subtitles = task[4]
-            embed_thumbnail = task[5]
-            download_type = task[6] if len(task) > 6 else 'single'
-            channel_mode = task[7] if len(task) > 7 else 'all'
-            video_count = task[8] if len(task) > 8 else 10
-
-            with status_lock:
-                queued_urls.discard(url)
-            cancel_event.clear()
-            
             with status_lock:
-                # Increment active download count and track URL
-                active_downloads_urls.add(url)
-                download_status['active_downloads'] = download_status.get('active_downloads', 0) + 1
-                download_status['is_downloading'] = download_status['active_downloads'] > 0
-                download_status['current_url'] = url
-                download_status['output_folder'] = folder
-                download_status['mode'] = mode
-                download_status['progress'] = 0
-                download_status['status'] = 'starting'
-                download_status['current_action'] = 'Preparing download'
-                download_status['speed'] = ''
-                download_status['eta'] = ''
-                download_status['title'] = ''
-                download_status['last_progress_at'] = time.time()
-                download_status['stalled_for'] = 0
-                download_status['playlist_total'] = 0
-                download_status['playlist_completed'] = 0
-                download_status['playlist_current'] = 0
-            
-            print(f"[Worker {worker_id}] Starting download: {url}")
-            add_log(f"Starting download: {url}")
-            add_log(f"Download type: {download_type}")
-            if download_type == 'channel':
-                add_log(f"Channel mode: {channel_mode}")
-                if channel_mode == 'recent':
-                    add_log(f"Downloading {video_count} recent videos")
-            add_log(f"Output folder: {folder}")
-            download_started_at = time.time()
-            
+                job = jobs.get(task)
+                # Claim and mark started in one step so a cancel can't slip in between;
+                # the job store learns about it through update_job() below
+                claimed = job is not None and job['status'] == 'queued'
+                if claimed:
+                    busy_download_workers += 1
+                    end_span(job, 'queue')
+                    queued_urls.discard(job['url'])
+                    active_downloads_urls.add(job['url'])
+                    update_job(
+                        job,
+                        status='starting',
+                        current_action='Preparing download',
+                        started_at=time.time(),
+                        last_progress_at=time.time(),
+                    )
+            if not claimed:
+                # Job was cancelled, pruned or already claimed while waiting in the queue
+                download_queue.task_done()
+                continue
+
+            # From here on the slot is released in the finally below, even if
+            # the job's stored options turn out to be unusable
             try:
+                print(f"[Worker {worker_id}] Received job {job['id']}: {job['url']}")
+                # Unpack the options captured when the job was submitted
+                options = job['_options']
+                url = job['url']
+                folder = options['folder']
+                mode = options['mode']
+                resolution = options['resolution']
+                subtitles = options['subtitles']
+                embed_thumbnail = options['embed_thumbnail']
+                download_type = options['download_type']
+                channel_mode = options['channel_mode']
+                video_count = options['video_count']
+
+                worker_context.job = job
+
+                print(f"[Worker {worker_id}] Starting download: {url}")
+                add_log(f"Starting download: {url}", job)
+                add_log(f"Download type: {download_type}", job)
+                if download_type == 'channel':
+                    add_log(f"Channel mode: {channel_mode}", job)
+                    if channel_mode == 'recent':
+                        add_log(f"Downloading {video_count} recent videos", job)
+                add_log(f"Output folder: {folder}", job)
+                download_started_at = time.time()
+
+                if download_type in ('playlist', 'channel') and Config.PLAYLIST_FAN_OUT and not job['parent_id']:
+                    fan_out_playlist_job(job, worker_id)
+                    continue
+
+                archive_key = archive_key_for_url(url) if download_type == 'single' else None
+                archived = None
+                if archive_key and Config.ARCHIVE_ENABLED and not options.get('force'):
+                    archived = download_archive.lookup(*archive_key, mode)
+                if archived:
+                    add_log(f"Already downloaded: {archived['output_path']} (skipping, use force to download again)", job)
+                    update_job(
+                        job,
+                        status='completed',
+                        progress=100,
+                        current_action='Already downloaded',
+                        title=job['title'] or archived['title'] or '',
+                        filename=os.path.basename(archived['output_path']),
+                        downloaded_bytes=archived['filesize'] or 0,
+                    )
+                    continue
+
                 print(f"[Worker {worker_id}] Getting yt-dlp options...")
-                ydl_opts = get_ydl_opts(folder, mode, resolution, subtitles, embed_thumbnail)
+                with job_span(job, 'options'):
+                    ydl_opts = get_ydl_opts(folder, mode, resolution, subtitles, embed_thumbnail, job)
+                pp_specs = []
+                if POSTPROCESS_WORKERS and download_type == 'single':
+                    # Run these after the download, on the post-processing pool
+                    pp_specs = ydl_opts.pop('postprocessors', [])
+                if options.get('filename_prefix'):
+                    # Playlist entry: keep the playlist's numbering in the file name
+                    prefix = options['filename_prefix'].replace('%', '%%')
+                    ydl_opts['outtmpl'] = {
+                        'default': os.path.join(folder.replace('%', '%%'), prefix + '%(title)s [%(id)s].%(ext)s'),
+                    }
                 
                 # Modify ydl_opts based on download type
                 if download_type == 'playlist':
-                    add_log("Playlist mode: downloading all videos from playlist")
+                    add_log("Playlist mode: downloading all videos from playlist", job)
                 elif download_type == 'channel':
                     if channel_mode == 'all':
                         # Download all videos from channel
-                        add_log("Channel mode: downloading all videos from channel")
+                        add_log("Channel mode: downloading all videos from channel", job)
                     elif channel_mode == 'recent':
                         # Download only recent N videos
                         ydl_opts['playlistend'] = video_count
-                        add_log(f"Channel mode: downloading {video_count} most recent videos")
+                        add_log(f"Channel mode: downloading {video_count} most recent videos", job)
+                if download_type != 'single' and Config.ARCHIVE_ENABLED and not options.get('force'):
+                    ydl_opts['match_filter'] = functools.partial(archive_match_filter, mode)
+
+                # Start with whatever fallback last worked for this site
+                remembered_fallback = fallback_memory.get(url)
+                if remembered_fallback:
+                    metrics.inc('remembered_fallbacks_total')
+                    add_log(f"Using remembered fallback for this site: {remembered_fallback}", job)
+                    ydl_opts = apply_fallback_options(ydl_opts, remembered_fallback, job)
 
                 def attempt_download(opts):
                     print(f"[Worker {worker_id}] Starting yt-dlp extraction...")
                     with yt_dlp.YoutubeDL(opts) as ydl:  # type: ignore[arg-type]
                         return ydl.extract_info(url, download=True)
 
-                try:
-                    info = attempt_download(ydl_opts)
-                except Exception as e:
-                    error_msg = str(e)
-                    if cancel_event.is_set() or 'Cancelled by user' in error_msg:
-                        raise
-
-                    if 'Could not copy Chrome cookie database' in error_msg:
-                        add_log("Browser cookies are locked. Close the browser or provide a cookies.txt file. Retrying without browser cookies...")
-                        no_cookie_opts = copy.deepcopy(ydl_opts)
-                        if 'cookiesfrombrowser' in no_cookie_opts:
-                            del no_cookie_opts['cookiesfrombrowser']
-                        info = attempt_download(no_cookie_opts)
-                    elif 'Requested format is not available' in error_msg or 'Only images are available' in error_msg:
-                        add_log("Retrying with alternate YouTube client settings...")
-                        alt_opts = copy.deepcopy(ydl_opts)
-                        alt_opts['extractor_args'] = build_youtube_extractor_args(
-                            allow_fallback_clients=True
-                        )
-
-                        # Keep format selection aligned with primary settings
-                        alt_opts['format'] = ydl_opts.get('format', 'bestvideo*+bestaudio/best')
-
-                        if not Config.USE_NODE_RUNTIME:
-                            import shutil
-                            node_path = shutil.which('node')
-                            if node_path:
-                                alt_opts['js_runtimes'] = {
-                                    'node': {
-                                        'path': node_path
-                                    }
-                                }
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore[arg-type]
+                    # Extract and process separately so a format-selection
+                    # failure still leaves the extracted info for the retry
+                    raw_info = None
+                    try:
+                        if remembered_fallback != FALLBACK_ALT_CLIENTS:
+                            raw_info = metadata_cache.get(metadata_cache_key(url))
+                        if raw_info is not None:
+                            print(f"[Worker {worker_id}] Reusing cached extraction...")
+                            add_log("Reusing metadata from preview (skipping extraction)", job)
+                        else:
+                            print(f"[Worker {worker_id}] Starting yt-dlp extraction...")
+                            with job_span(job, 'extraction'):
+                                raw_info = ydl.extract_info(url, download=False, process=False)
+                        info = ydl.process_ie_result(raw_info, download=True)
+                    except Exception as e:
+                        error_msg = str(e)
+                        if job['_cancel'].is_set() or 'Cancelled by user' in error_msg:
+                            raise
 
-                        info = attempt_download(alt_opts)
-                    else:
-                        raise
+                        if 'Could not copy Chrome cookie database' in error_msg and 'cookiesfrombrowser' in ydl_opts:
+                            add_log("Browser cookies are locked. Close the browser or provide a cookies.txt file. Retrying without browser cookies...", job)
+                            metrics.inc('fallbacks_total', fallback=FALLBACK_NO_BROWSER_COOKIES)
+                            # The cookie jar is built once per instance, so this needs a new one
+                            info = attempt_download(apply_fallback_options(ydl_opts, FALLBACK_NO_BROWSER_COOKIES, job))
+                            fallback_memory.remember(url, FALLBACK_NO_BROWSER_COOKIES)
+                        elif (
+                            ('Requested format is not available' in error_msg or 'Only images are available' in error_msg)
+                            and remembered_fallback != FALLBACK_ALT_CLIENTS
+                        ):
+                            add_log("Retrying with alternate YouTube client settings...", job)
+                            metrics.inc('fallbacks_total', fallback=FALLBACK_ALT_CLIENTS)
+                            alt_opts = apply_fallback_options(ydl_opts, FALLBACK_ALT_CLIENTS, job)
+                            if alt_opts.get('js_runtimes') != ydl_opts.get('js_runtimes'):
+                                # JS runtimes are fixed when the instance is created
+                                info = attempt_download(alt_opts)
+                            else:
+                                info = retry_with_alternate_clients(ydl, url, raw_info, alt_opts, job)
+                            fallback_memory.remember(url, FALLBACK_ALT_CLIENTS)
+                        else:
+                            raise
 
                 print(f"[Worker {worker_id}] yt-dlp extraction complete")
 
@@ -591,136 +2707,358 @@ def download_worker(worker_id):
                             fmt_parts.append(
                                 f"{fmt.get('format_id')} ({fmt.get('ext')}, {fmt.get('height')}p, {fmt.get('vcodec')}/{fmt.get('acodec')})"
                             )
-                        add_log(f"Selected formats: {', '.join(fmt_parts)}")
+                        add_log(f"Selected formats: {', '.join(fmt_parts)}", job)
                     else:
                         add_log(
                             "Selected format: "
-                            f"{info.get('format_id')} ({info.get('ext')}, {info.get('height')}p, {info.get('vcodec')}/{info.get('acodec')})"
+                            f"{info.get('format_id')} ({info.get('ext')}, {info.get('height')}p, {info.get('vcodec')}/{info.get('acodec')})",
+                            job
                         )
 
                     if mode == "Video" and resolution == "Best":
                         height = info.get('height')
                         if isinstance(height, int) and height < 720:
-                            add_log("Low quality detected for Best. Consider setting YouTube PO tokens or cookies for higher formats.")
+                            add_log("Low quality detected for Best. Consider setting YouTube PO tokens or cookies for higher formats.", job)
                 except Exception:
                     pass
 
-                # Update status to show finalization
-                with status_lock:
-                    download_status['progress'] = 97
-                    download_status['current_action'] = 'Verifying downloaded files...'
-                    download_status['status'] = 'finalizing'
-                
-                # Fast verification - just check if files exist in download folder
-                video_exts = {'.mp4', '.mkv', '.webm', '.mov', '.flv', '.avi'}
-                audio_exts = {'.mp3', '.m4a', '.opus', '.aac', '.wav', '.flac'}
-                allowed_exts = audio_exts if mode == "Audio" else video_exts
-
-                print(f"[Worker {worker_id}] Verifying files in {folder}...")
-                # Quick check: just verify at least one media file exists
-                media_found = False
-                try:
-                    if not os.path.exists(folder):
-                        raise Exception(f"Download folder not found: {folder}")
-                    
-                    files = os.listdir(folder)
-                    print(f"[Worker {worker_id}] Found {len(files)} files in folder")
-                    
-                    for file in files:
-                        ext = os.path.splitext(file)[1].lower()
-                        if ext in allowed_exts:
-                            media_found = True
-                            print(f"[Worker {worker_id}] ✓ Media file found: {file}")
-                            add_log(f"✓ Media file found: {file}")
-                            break
-                except Exception as e:
-                    print(f"[Worker {worker_id}] File verification error: {e}")
-                    add_log(f"File verification error: {str(e)}")
+                if pp_specs:
+                    # FFmpeg steps are CPU-bound: hand them to the post-processing
+                    # pool so this slot can start the next download right away
+                    submit_postprocessing(job, info, pp_specs)
+                else:
+                    complete_download(job, info, f"Worker {worker_id}")
+                info = raw_info = None
+                
+            except Exception as e:
+                fail_job(job, e, f"Worker {worker_id}")
+            
+            finally:
+                worker_context.job = None
+                finish_job(job)
+                with status_lock:
+                    busy_download_workers -= 1
+                print(f"[Worker {worker_id}] Job {job['id']} released. Active downloads: {len(active_downloads_urls)}")
+                download_queue.task_done()
+                
+        except queue.Empty:
+            # Timeout waiting for task, just continue loop
+            continue
+        except Exception as e:
+            print(f"[Worker {worker_id}] Worker loop error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            add_log(f"Worker error: {str(e)}")
+
+
+def set_download_workers(count):
+    """Resize the download worker pool at runtime
+
+    Growing starts threads for the new slots right away; shrinking lets the
+    surplus workers finish their current job and retire.
+    """
+    global download_worker_target
+    with status_lock:
+        download_worker_target = count
+        while len(worker_threads) < count:
+            worker_threads.append(None)
+        for worker_id in range(1, count + 1):
+            if worker_threads[worker_id - 1] is None:
+                worker_thread = threading.Thread(target=download_worker, args=(worker_id,), daemon=True)
+                worker_threads[worker_id - 1] = worker_thread
+                worker_thread.start()
+                print(f"Started download worker {worker_id}/{count}")
+
+
+class ConcurrencyController:
+    """AIMD tuning of the download worker count and per-job fragment concurrency
+
+    Every AUTOTUNE_INTERVAL seconds it samples aggregate throughput, HTTP
+    throttling errors (403/429) and downloads that stalled since the last
+    sample (a stalled job counts once, until it makes progress again). When
+    those reach AUTOTUNE_BACKOFF_RATIO of the working jobs, both values are
+    halved; an increase that made throughput drop is undone; a clean
+    interval with every slot busy adds one worker while work is queued,
+    otherwise one fragment connection. Values stay within the configured
+    bounds and each change is kept in `decisions`.
+    """
+
+    THROTTLE_SIGNS = ('HTTP Error 403', 'HTTP Error 429', 'Too Many Requests', 'rate-limit')
+
+    def __init__(self):
+        self.enabled = Config.AUTOTUNE_CONCURRENCY
+        self.workers = MAX_CONCURRENT_DOWNLOADS
+        self.fragments = Config.CONCURRENT_FRAGMENT_DOWNLOADS
+        self.min_workers = Config.AUTOTUNE_MIN_DOWNLOADS
+        self.max_workers = Config.AUTOTUNE_MAX_DOWNLOADS
+        self.min_fragments = Config.AUTOTUNE_MIN_FRAGMENTS
+        self.max_fragments = Config.AUTOTUNE_MAX_FRAGMENTS
+        self.throttle_errors = 0
+        self.stalled_ids = set()  # Jobs already counted as stalled, see take_sample()
+        self.last_throughput = None
+        self.last_increase = None  # 'workers' or 'fragments' if the last tick raised one
+        self.sample = {}
+        self.decisions = collections.deque(maxlen=20)
+        self.lock = threading.Lock()
+
+    def record_error(self, message):
+        """Count a failed download if it looks like throttling"""
+        if any(sign in message for sign in self.THROTTLE_SIGNS):
+            with self.lock:
+                self.throttle_errors += 1
+
+    def take_sample(self):
+        """Aggregate throughput, stalls and backlog across jobs"""
+        now = time.time()
+        with status_lock:
+            working = [job for job in jobs.values() if is_working(job)]
+            throughput = sum(job['_speed_bps'] for job in working if now - job['last_progress_at'] < 5)
+            stalled_ids = {
+                job['id'] for job in working
+                if job['status'] == 'downloading' and now - job['last_progress_at'] > Config.AUTOTUNE_STALL_SECONDS
+            }
+            downloading = sum(1 for job in working if job['status'] in ('starting', 'downloading'))
+            backlog = sum(1 for job in jobs.values() if job['status'] == 'queued')
+        with self.lock:
+            throttled, self.throttle_errors = self.throttle_errors, 0
+            # Only new stalls count; a job leaves the set once it progresses or ends
+            stalled = len(stalled_ids - self.stalled_ids)
+            self.stalled_ids = stalled_ids
+        return {
+            'throughput': throughput,
+            'working': len(working),
+            'downloading': downloading,
+            'stalled': stalled,
+            'throttled': throttled,
+            'backlog': backlog,
+        }
+
+    def tick(self):
+        """Take one sample and adjust the concurrency if needed"""
+        sample = self.take_sample()
+        change = None
+        with self.lock:
+            self.sample = sample
+            if not self.enabled or not (sample['downloading'] or sample['throttled']):
+                self.last_throughput = None
+                self.last_increase = None
+                return
+            workers, fragments = self.workers, self.fragments
+            troubled = sample['throttled'] + sample['stalled']
+            if troubled >= max(1, sample['working']) * Config.AUTOTUNE_BACKOFF_RATIO:
+                workers = max(self.min_workers, workers // 2)
+                fragments = max(self.min_fragments, fragments // 2)
+                reason = f"{sample['throttled']} throttled, {sample['stalled']} stalled: backing off"
+            elif self.last_increase and self.last_throughput and sample['throughput'] < self.last_throughput * 0.9:
+                if self.last_increase == 'workers':
+                    workers = max(self.min_workers, workers - 1)
+                else:
+                    fragments = max(self.min_fragments, fragments - 1)
+                reason = f"throughput fell after adding {self.last_increase}: undoing"
+            elif troubled:
+                reason = None  # Isolated trouble: hold steady rather than grow
+            elif sample['backlog'] and sample['downloading'] >= workers and workers < self.max_workers:
+                workers += 1
+                reason = f"{sample['backlog']} queued with every slot busy"
+            elif not sample['backlog'] and fragments < self.max_fragments:
+                fragments += 1
+                reason = "spare capacity: more fragment connections per download"
+            else:
+                reason = None
+
+            self.last_increase = (
+                'workers' if workers > self.workers else 'fragments' if fragments > self.fragments else None
+            )
+            self.last_throughput = sample['throughput']
+            if reason and (workers, fragments) != (self.workers, self.fragments):
+                change = self.apply(workers, fragments, reason)
+        if change:
+            self.enact(*change)
+
+    def apply(self, workers, fragments, reason):
+        """Switch to new values (caller holds self.lock) and record the decision; enact() it afterwards"""
+        self.workers, self.fragments = workers, fragments
+        self.decisions.append({
+            'time': time.time(),
+            'workers': workers,
+            'fragments': fragments,
+            'throughput': format_speed(self.sample.get('throughput')),
+            'reason': reason,
+        })
+        return workers, fragments, reason
+
+    @staticmethod
+    def enact(workers, fragments, reason):
+        """Resize the worker pool for a decision from apply()
+
+        Called after releasing self.lock: this takes status_lock, and status
+        requests take self.lock (describe()) while holding status_lock.
+        """
+        set_download_workers(workers)
+        add_log(f"Concurrency: {workers} downloads x {fragments} fragments ({reason})")
+
+    def resize(self, workers=None, fragments=None, enabled=None):
+        """Operator override, clamped to 1..AUTOTUNE_MAX_*; autotuning carries on from the new values"""
+        change = None
+        with self.lock:
+            if enabled is not None:
+                self.enabled = enabled
+            workers = self.workers if workers is None else max(1, min(self.max_workers, workers))
+            fragments = self.fragments if fragments is None else max(1, min(self.max_fragments, fragments))
+            self.last_increase = None
+            if (workers, fragments) != (self.workers, self.fragments):
+                change = self.apply(workers, fragments, 'set by operator')
+        if change:
+            self.enact(*change)
+
+    def describe(self):
+        """Current settings, last sample and recent decisions for the status API"""
+        with self.lock:
+            sample = dict(self.sample)
+            if 'throughput' in sample:
+                sample['throughput'] = format_speed(sample['throughput'])
+            return {
+                'autotune': self.enabled,
+                'workers': self.workers,
+                'fragments': self.fragments,
+                'bounds': {
+                    'workers': [self.min_workers, self.max_workers],
+                    'fragments': [self.min_fragments, self.max_fragments],
+                },
+                'sample': sample,
+                'decisions': list(self.decisions),
+            }
+
+    def run(self):
+        """Background loop adjusting every AUTOTUNE_INTERVAL seconds"""
+        while True:
+            time.sleep(Config.AUTOTUNE_INTERVAL)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Concurrency controller error: {e}")
+
+
+concurrency = ConcurrencyController()
+
+
+def restore_jobs():
+    """Reload the job store and requeue whatever a restart interrupted
+
+    Unfinished jobs go back on the queue in submission order; their .part
+    files are picked up again through yt-dlp's continuedl. A playlist whose
+    listing finished keeps its entries; one cut off mid-listing is listed
+    again (the download archive skips entries that already completed).
+    """
+    restored = {}
+    requeue = []
+    dropped = []
+    for record, options in job_store.load():
+        parent = None
+        if record['parent_id']:
+            parent = restored.get(record['parent_id'])
+            if parent is None or not parent['_fanned_out']:
+                dropped.append(record['id'])
+                continue
+        if record['status'] not in FINISHED_JOB_STATES and not (record.get('fanned_out') and not parent):
+            record.update(
+                status='queued',
+                progress=0,
+                speed='',
+                eta='',
+                current_action='Queued (resuming after restart)',
+                started_at=0,
+            )
+        job = create_job(record['url'], options, parent=parent, record=record)
+        restored[job['id']] = job
+        if job['status'] == 'queued':
+            requeue.append(job)
+    if dropped:
+        job_store.delete(dropped)
+
+    # Entries still waiting in the spill queue keep their parents open
+    spilled_counts = download_spill.counts_by_parent()
+    with status_lock:
+        for parent_id, count in spilled_counts.items():
+            if parent_id in restored:
+                restored[parent_id]['_spilled'] = count
+        for job in restored.values():
+            if job['_fanned_out'] and job['status'] not in FINISHED_JOB_STATES:
+                active_downloads_urls.add(job['url'])
+        for job in requeue:
+            queued_urls.add(job['url'])
+            download_queue.put(job['id'])
+    for job in restored.values():
+        if job['_fanned_out'] and job['status'] not in FINISHED_JOB_STATES:
+            update_parent_progress(job)
+    if requeue:
+        print(f"Restored {len(restored)} job(s) from the job store, {len(requeue)} requeued")
+        add_log(f"Resuming {len(requeue)} unfinished download(s) after restart")
+
 
-                if not media_found:
-                    raise Exception("Download finished but no media output file was found")
+def is_stuck(job):
+    """True for a job near completion that no worker is running any more"""
+    return (
+        job['status'] in ('downloading', 'processing', 'finalizing')
+        and job['url'] not in active_downloads_urls
+        and (job.get('progress') or 0) >= 95
+    )
 
-                # Update progress before cleanup
-                with status_lock:
-                    download_status['progress'] = 98
-                    download_status['current_action'] = 'Cleaning up temporary files...'
-                
-                # Clean up intermediate files (thumbnails, etc)
-                print(f"[Worker {worker_id}] Starting cleanup...")
-                add_log("Cleaning up intermediate files...")
-                cleanup_intermediate_files(folder, download_status.get('title', 'Unknown'))
-                print(f"[Worker {worker_id}] Cleanup complete")
-                
-                # Mark as completed
-                with status_lock:
-                    download_status['status'] = 'completed'
-                    download_status['progress'] = 100
-                    download_status['current_action'] = 'Complete!'
-                    download_status['eta'] = ''
-                    download_status['speed'] = ''
-                    if download_status.get('playlist_total', 0) > 0:
-                        download_status['playlist_completed'] = download_status.get('playlist_total', 0)
-                
-                print(f"[Worker {worker_id}] ✓ Download completed successfully!")
-                add_log("✓ Download completed successfully!")
-                
-            except Exception as e:
-                with status_lock:
-                    if cancel_event.is_set() or 'Cancelled by user' in str(e):
-                        download_status['status'] = 'cancelled'
-                        download_status['current_action'] = 'Cancelled'
-                    else:
-                        download_status['status'] = 'error'
-                        # Don't reset progress to 0 - keep it at current value
-                        download_status['current_action'] = 'Error occurred'
-                
-                error_msg = str(e)
-                if cancel_event.is_set() or 'Cancelled by user' in error_msg:
-                    print(f"[Worker {worker_id}] ✗ Cancelled")
-                    add_log("✗ Cancelled by user")
-                else:
-                    print(f"[Worker {worker_id}] ✗ Error: {error_msg}")
-                    add_log(f"✗ Error: {error_msg}")
-                if 'Requested format is not available' in error_msg or 'Only images are available' in error_msg:
-                    add_log("Hint: This video may require a YouTube PO token or JS runtime. Try setting PO tokens in config.py or enabling Node.js runtime.")
-                
-                # Print full traceback to terminal for debugging
-                import traceback
-                print(f"[Worker {worker_id}] Full traceback:")
-                traceback.print_exc()
-            
-            finally:
-                # Decrement active download count and remove URL from active set
-                with status_lock:
-                    active_downloads_urls.discard(url)  # Remove URL from active set
-                    download_status['active_downloads'] = max(0, download_status.get('active_downloads', 1) - 1)
-                    download_status['is_downloading'] = download_status['active_downloads'] > 0
-                
-                print(f"[Worker {worker_id}] Task completed. Active downloads: {download_status.get('active_downloads', 0)}")
-                download_queue.task_done()
-                
-        except queue.Empty:
-            # Timeout waiting for task, just continue loop
-            continue
+
+def recover_stuck_jobs():
+    """Finalize stuck jobs whose output file exists
+
+    Candidates are picked under status_lock but their files are stat()ed
+    off it, so a slow network share can't hold up API requests.
+    """
+    with status_lock:
+        candidates = [(job, job['_output_path']) for job in jobs.values() if is_stuck(job)]
+    recovered = [(job, path) for job, path in candidates if path and os.path.isfile(path)]
+    with status_lock:
+        for job, path in recovered:
+            if is_stuck(job):  # It may have moved on meanwhile
+                add_log("Output file found for a stuck job, marking it complete", job)
+                update_job(job, status='completed', progress=100, current_action='Complete!', eta='', speed='', filename=os.path.basename(path))
+
+
+def stuck_job_checker():
+    """Background thread running stuck-job recovery every STUCK_JOB_CHECK_INTERVAL seconds"""
+    while True:
+        time.sleep(Config.STUCK_JOB_CHECK_INTERVAL)
+        try:
+            recover_stuck_jobs()
         except Exception as e:
-            print(f"[Worker {worker_id}] Worker loop error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            add_log(f"Worker error: {str(e)}")
+            print(f"[Stuck-job checker] Error: {e}")
+
 
+# Resolve FFmpeg/Node/cookies once before any job needs them
+_env = get_runtime_environment()
+print(f"Runtime: ffmpeg={'bin/' if _env.ffmpeg_location else ('system' if _env.ffmpeg_available else 'missing')}, "
+      f"node={_env.node_path or 'missing'}")
 
 # Start multiple download worker threads for concurrent downloads
 def start_download_workers():
     """Start multiple worker threads"""
-    for i in range(MAX_CONCURRENT_DOWNLOADS):
-        worker_thread = threading.Thread(target=download_worker, args=(i+1,), daemon=True)
-        worker_thread.start()
-        worker_threads.append(worker_thread)
-        print(f"Started download worker {i+1}/{MAX_CONCURRENT_DOWNLOADS}")
+    set_download_workers(download_worker_target)
 
+if Config.PERSIST_JOBS:
+    threading.Thread(target=job_store.run, daemon=True).start()
+    atexit.register(job_store.flush)  # Don't lose the last changes on a clean shutdown
+    restore_jobs()
+    if download_spill.size():
+        print(f"{download_spill.size()} spilled submission(s) waiting on disk")
+elif download_spill.size():
+    download_spill.clear()  # Queued jobs don't outlive a restart without the job store
 start_download_workers()
 print(f"All {len(worker_threads)} download workers started successfully")
 
+for _pp_worker_id in range(POSTPROCESS_WORKERS):
+    threading.Thread(target=postprocess_worker, args=(_pp_worker_id + 1,), daemon=True).start()
+print(f"Started {POSTPROCESS_WORKERS} post-processing workers")
+
+threading.Thread(target=concurrency.run, daemon=True).start()
+threading.Thread(target=stuck_job_checker, daemon=True).start()
+
 
 @app.route('/')
 def index():
@@ -742,43 +3080,52 @@ def get_video_info():
         return jsonify({'success': False, 'error': 'URL is required'}), 400
         
     try:
-        # Minimal options for fast extraction
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True,
-            'extract_flat': 'in_playlist',
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore[arg-type]
-            info = ydl.extract_info(url, download=False)
-            
-            # Use 'thumbnail' or first entry in 'thumbnails'
-            thumb = info.get('thumbnail')
-            thumbs = info.get('thumbnails') or []
-            if not thumb and isinstance(thumbs, list) and len(thumbs) > 0:
-                last_thumb = cast(Any, thumbs[-1])
-                thumb = last_thumb.get('url')
-                
-            return jsonify({
-                'success': True,
-                'title': info.get('title', 'Unknown Title'),
-                'thumbnail': thumb,
-                'duration': info.get('duration_string'),
-                'is_playlist': 'entries' in info
+        cache_key = metadata_cache_key(url)
+        info = metadata_cache.get(cache_key)
+        if info is None:
+            # Same client/cookie settings as downloads so the result can be reused,
+            # but keep playlists flat for fast extraction
+            ydl_opts = dict(get_runtime_environment().base_ydl_opts)
+            ydl_opts.update({
+                'skip_download': True,
+                'extract_flat': 'in_playlist',
             })
+            try:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore[arg-type]
+                    info = ydl.extract_info(url, download=False)
+                metadata_cache.put(cache_key, info)
+            except Exception as e:
+                if 'cookiesfrombrowser' not in ydl_opts or 'cookie' not in str(e).lower():
+                    raise
+                # Preview still works without browser cookies, but that result
+                # may differ from what a download sees, so don't cache it
+                del ydl_opts['cookiesfrombrowser']
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore[arg-type]
+                    info = ydl.extract_info(url, download=False)
+
+        # Use 'thumbnail' or first entry in 'thumbnails'
+        thumb = info.get('thumbnail')
+        thumbs = info.get('thumbnails') or []
+        if not thumb and isinstance(thumbs, list) and len(thumbs) > 0:
+            last_thumb = cast(Any, thumbs[-1])
+            thumb = last_thumb.get('url')
+            
+        return jsonify({
+            'success': True,
+            'title': info.get('title', 'Unknown Title'),
+            'thumbnail': thumb,
+            'duration': info.get('duration_string'),
+            'is_playlist': 'entries' in info
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
-@app.route('/api/download', methods=['POST'])
-def start_download():
-    """API endpoint to start a download"""
-    data = request.get_json(silent=True) or {}
-    
-    if not data:
-        return jsonify({'success': False, 'error': 'Invalid JSON data'}), 400
-    
-    url = data.get('url', '').strip()
+def download_options(data):
+    """Validated job options from a download request (everything but the URL)
+
+    Raises ValueError if the output folder can't be created.
+    """
     mode = data.get('mode', Config.DEFAULT_MODE)
     if mode not in ('Video', 'Audio'):
         mode = Config.DEFAULT_MODE
@@ -799,11 +3146,13 @@ def start_download():
     except Exception:
         video_count = 10
     video_count = max(1, min(100, video_count))
-    
-    # Validate inputs
-    if not url:
-        return jsonify({'success': False, 'error': 'URL is required'}), 400
-    
+    try:
+        log_limit = int(data.get('log_limit', Config.JOB_LOG_LIMIT))
+    except Exception:
+        log_limit = Config.JOB_LOG_LIMIT
+    log_limit = max(10, min(Config.MAX_JOB_LOG_LIMIT, log_limit))
+    force = bool(data.get('force', False))
+
     if not folder:
         folder = Config.DEFAULT_DOWNLOAD_FOLDER
 
@@ -815,113 +3164,787 @@ def start_download():
     try:
         os.makedirs(folder, exist_ok=True)
     except Exception as e:
-        return jsonify({'success': False, 'error': f'Cannot create folder: {str(e)}'}), 400
+        raise ValueError(f'Cannot create folder: {str(e)}')
+
+    return {
+        'folder': folder,
+        'mode': mode,
+        'resolution': resolution,
+        'subtitles': subtitles,
+        'embed_thumbnail': embed_thumbnail,
+        'download_type': download_type,
+        'channel_mode': channel_mode,
+        'video_count': video_count,
+        'log_limit': log_limit,
+        'force': force,
+        # Scheduling: fair share is per client
+        'client': str(data.get('client') or request.remote_addr or ''),
+    }
+
+
+@app.route('/api/download', methods=['POST'])
+def start_download():
+    """API endpoint to start a download"""
+    data = request.get_json(silent=True) or {}
+    
+    if not data:
+        return jsonify({'success': False, 'error': 'Invalid JSON data'}), 400
+    
+    url = data.get('url', '').strip()
+    
+    # Validate inputs
+    if not url:
+        return jsonify({'success': False, 'error': 'URL is required'}), 400
+
+    try:
+        options = download_options(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     # Ensure status defaults exist
     get_download_status()
 
-    # Check if this URL is already being downloaded
+    # A preview's metadata gives the scheduler its size estimate
+    options['estimate'] = estimated_seconds(metadata_cache.peek(metadata_cache_key(url), 'duration', 'filesize_approx', 'filesize'))
+
+    # Check if this URL is already being downloaded and reserve it, so a
+    # concurrent submission of it is turned away while this one is queued
     with status_lock:
         if url in active_downloads_urls:
             return jsonify({'success': False, 'error': 'This URL is already being downloaded'}), 409
         if url in queued_urls:
             return jsonify({'success': False, 'error': 'This URL is already queued'}), 409
-        
-        # Reset logs for new download (allow unlimited concurrent downloads)
-        download_status['logs'] = []
-        download_status['status'] = 'queued'
-        download_status['current_action'] = 'Queued for download'
-        download_status['progress'] = 0
-        # Don't set is_downloading here - worker will handle it
-    
-    # Add to download queue
+        queued_urls.add(url)
+
+    # Register the job; the worker owns it from here on
+    spilled = True
     try:
-        with status_lock:
-            queued_urls.add(url)
-        download_queue.put((url, folder, mode, resolution, subtitles, embed_thumbnail, download_type, channel_mode, video_count), timeout=5)
+        if download_spill.size() and download_spill.contains(url):
+            return jsonify({'success': False, 'error': 'This URL is already queued'}), 409
+        job_id, position, spilled = admit_job(url, options)
     except queue.Full:
-        with status_lock:
-            queued_urls.discard(url)
         return jsonify({'success': False, 'error': 'Download queue is full - try again later'}), 503
-    
-    return jsonify({'success': True, 'message': 'Download queued and processing...'})
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': f'Could not queue the download: {e}'}), 503
+    finally:
+        if spilled:
+            # Spilled jobs are found through the spill queue until they are loaded
+            with status_lock:
+                queued_urls.discard(url)
+    wait, start = estimated_start(position)
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'message': 'Download queued and processing...',
+        'position': position,
+        'spilled': spilled,
+        'estimated_wait': wait,
+        'estimated_start': start,
+    })
+
+
+def batch_request_data():
+    """URLs and options of a batch submission
+
+    Accepts a JSON array of URLs, a JSON object with `urls` (array or
+    newline-separated text) plus download options, or newline-separated
+    text as an uploaded `file` or the request body with the options as
+    form fields / query parameters.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            return data, {}
+        if isinstance(data, dict):
+            return data.get('urls'), data
+        return None, {}
+    options = {**request.args.to_dict(), **request.form.to_dict()}
+    for key in ('subtitles', 'embed_thumbnail', 'force'):
+        if key in options:
+            options[key] = options[key].strip().lower() in ('1', 'true', 'yes', 'on')
+    upload = request.files.get('file')
+    text = upload.read().decode('utf-8', 'replace') if upload else request.get_data(as_text=True)
+    return text, options
+
+
+@app.route('/api/download/batch', methods=['POST'])
+def start_batch_download():
+    """API endpoint to queue many URLs at once under one batch job
+
+    URLs are normalized and checked in one pass against each other, the
+    queued and active downloads and (unless `force`, YouTube URLs only)
+    the download archive;
+    the rest become entries of a single batch job, created and queued
+    atomically. Like playlist entries they don't count toward
+    MAX_QUEUED_JOBS. Returns a result per URL with its job ID.
+    """
+    urls, data = batch_request_data()
+    if isinstance(urls, str):
+        urls = urls.splitlines()
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({'success': False, 'error': 'Send a list of URLs (JSON array, "urls", or one URL per line)'}), 400
+    urls = [url.strip() for url in urls if url.strip() and not url.strip().startswith('#')]
+    if not urls:
+        return jsonify({'success': False, 'error': 'URL is required'}), 400
+    if len(urls) > Config.MAX_BATCH_URLS:
+        return jsonify({'success': False, 'error': f'At most {Config.MAX_BATCH_URLS} URLs per batch'}), 413
+    try:
+        options = download_options(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    results = []
+    seen = {}  # normalized URL -> index in results
+    for url in urls:
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+            results.append({'url': url, 'status': 'invalid'})
+            continue
+        key = metadata_cache_key(url)
+        if key in seen:
+            results.append({'url': url, 'status': 'duplicate', 'same_as': results[seen[key]]['url']})
+            continue
+        seen[key] = len(results)
+        results.append({'url': url, 'status': 'new', 'key': key})
+
+    if Config.ARCHIVE_ENABLED and not options['force'] and options['download_type'] == 'single':
+        # YouTube IDs come straight from the URL; other sites would need the
+        # extractor scan per URL, so the worker checks those before extracting
+        archive_keys = {}
+        for result in results:
+            if result['status'] == 'new':
+                archive_key = archive_key_for_url(result['url'], scan_extractors=False)
+                if archive_key:
+                    archive_keys[result['url']] = (archive_key[0].lower(), str(archive_key[1]))
+        archived = download_archive.lookup_many(archive_keys.values(), options['mode'])
+        for result in results:
+            entry = archived.get(archive_keys.get(result['url']))
+            if result['status'] == 'new' and entry:
+                result.update(status='archived', output_path=entry['output_path'])
+
+    spilled_keys = set()
+    if download_spill.size():
+        try:
+            spilled_keys = download_spill.contains_many(result['key'] for result in results if result['status'] == 'new')
+        except sqlite3.Error as e:
+            return jsonify({'success': False, 'error': f'Could not check the queue: {e}'}), 503
+
+    get_download_status()
+    parent = None
+    overflow = []
+    with status_lock:
+        busy = {metadata_cache_key(url): 'active' for url in active_downloads_urls}
+        busy.update((metadata_cache_key(url), 'queued') for url in queued_urls)
+        busy.update((key, 'queued') for key in spilled_keys)
+        accepted = [result for result in results if result['status'] == 'new' and result['key'] not in busy]
+        for result in results:
+            if result['status'] == 'new' and result['key'] in busy:
+                result['status'] = f"already_{busy[result['key']]}"
+        if accepted:
+            # Entries beyond the in-memory window go to the spill queue
+            room = len(accepted)
+            if Config.MAX_SPILLED_JOBS > 0:
+                room = max(0, Config.MAX_QUEUED_ENTRIES - download_queue.qsize(entries=True))
+            accepted, overflow = accepted[:room], accepted[room:]
+            if overflow and download_spill.size() + len(overflow) > Config.MAX_SPILLED_JOBS:
+                return jsonify({'success': False, 'error': 'Download queue is full - try again later'}), 503
+            # Only collects the rows: the writer thread commits them together
+            # once this request has let go of the lock
+            with job_store.grouped():
+                total = len(accepted) + len(overflow)
+                parent = create_job(f"batch:{uuid.uuid4().hex[:12]}", {**options, 'download_type': 'batch'})
+                end_span(parent, 'queue')
+                parent['_fanned_out'] = True
+                update_job(
+                    parent,
+                    status='downloading',
+                    title=f'Batch of {total} URLs',
+                    started_at=time.time(),
+                    current_action=f'Downloaded 0/{total} entries',
+                )
+                active_downloads_urls.add(parent['url'])
+                for index, result in enumerate(accepted, start=1):
+                    child = create_job(result['url'], {**options, 'playlist_index': index}, parent=parent)
+                    queued_urls.add(result['url'])
+                    result.update(status='queued', job_id=child['id'])
+            for result in overflow:
+                result.update(status='queued', job_id=uuid.uuid4().hex[:12], spilled=True)
+
+    if overflow:
+        rows = [
+            (result['job_id'], result['url'], {**options, 'playlist_index': index}, parent['id'])
+            for index, result in enumerate(overflow, start=len(accepted) + 1)
+        ]
+        with spill_lock:
+            try:
+                download_spill.push_many(rows)
+            except sqlite3.Error as e:
+                add_log(f"Could not queue {len(overflow)} batch entries: {e}", parent)
+                for result in overflow:
+                    result.update(status='error', error=str(e))
+                    del result['job_id'], result['spilled']
+            else:
+                with status_lock:
+                    parent['_spilled'] += len(overflow)
+                metrics.inc('jobs_spilled_total', len(overflow))
+    if parent is not None:
+        for result in accepted:
+            download_queue.put(result['job_id'])
+        update_parent_progress(parent)
+    for result in results:
+        result.pop('key', None)
+
+    counts = collections.Counter(result['status'] for result in results)
+    if parent is not None:
+        add_log(f"Batch queued: {counts['queued']} of {len(results)} URLs", parent)
+    return jsonify({
+        'success': True,
+        'job_id': parent['id'] if parent else None,
+        'queued': counts['queued'],
+        'counts': dict(counts),
+        'results': results,
+    })
+
+
+def build_focus_status():
+    """Build the legacy single-download status fields from the focus job"""
+    with status_lock:
+        active_count = sum(1 for job in jobs.values() if is_working(job))
+        focus_job = get_focus_job()
+
+        payload = {key: value for key, value in DEFAULT_STATUS.items() if key != 'logs'}
+        if focus_job is not None:
+            focus = job_snapshot(focus_job, include_logs=False)
+            for key in payload:
+                if key in focus:
+                    payload[key] = focus[key]
+            payload['current_url'] = focus['url']
+            payload['job_id'] = focus['id']
+            parent = jobs.get(focus_job['parent_id'])
+            if parent is not None:
+                # Playlist counters live on the parent job
+                payload['playlist_total'] = parent['playlist_total']
+                payload['playlist_completed'] = parent['playlist_completed']
+                payload['playlist_current'] = focus_job['playlist_index']
+            if payload['status'] == 'downloading' and payload['stalled_for'] >= STALL_WARNING_SECONDS:
+                current_action = payload.get('current_action') or 'Downloading...'
+                payload['current_action'] = f"No progress for {payload['stalled_for']}s. {current_action}"
+        payload['active_downloads'] = active_count
+        payload['is_downloading'] = active_count > 0
+    return payload
+
+
+def build_status_payload():
+    """Build the /api/status payload: the focus job's fields plus all jobs"""
+    get_download_status()
+    with status_lock:
+        payload = build_focus_status()
+        payload['logs'] = [line for _, line in download_status['logs']]
+        payload['log_seq'] = download_status['logs'][-1][0] if download_status['logs'] else 0
+        payload['jobs'] = [job_snapshot(job) for job in top_level_jobs()]
+        payload['version'] = status_version
+    payload['concurrency'] = concurrency.describe()
+    return payload
+
+
+def build_status_delta(since):
+    """Collect job fields and log lines that changed after version `since`"""
+    get_download_status()
+    with status_lock:
+        changed_jobs = {}
+        top_level = top_level_jobs()
+        for job in top_level:
+            if job['_version'] <= since:
+                continue
+            changed_jobs[job['id']] = {
+                key: job[key]
+                for key, version in job['_field_versions'].items()
+                if version > since
+            }
+        return {
+            'version': status_version,
+            'jobs': changed_jobs,
+            'job_ids': [job['id'] for job in top_level],
+            'logs': [line for _, line in logs_after(download_status['logs'], since)],
+            'logs_reset': download_status['logs_cleared_at'] > since,
+        }
+
+
+def status_etag():
+    """Entity tag for the current status: the version plus the longest stall
+
+    stalled_for grows without any write, so it is folded in to keep stall
+    warnings fresh for clients revalidating with If-None-Match.
+    """
+    with status_lock:
+        now = time.time()
+        stalled = max(
+            (int(now - job['last_progress_at']) for job in jobs.values()
+             if is_working(job) and job['last_progress_at']),
+            default=0,
+        )
+        return f"{status_version}-{stalled}"
 
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """API endpoint to get current download status"""
-    get_download_status()
+    """API endpoint to get current download status (all jobs, or one via ?job=<id>)
+
+    Supports conditional requests (ETag / If-None-Match -> 304) and a
+    `?since=<version>` cursor that returns only what changed after it.
+    """
+    job_id = request.args.get('job')
+    if job_id:
+        return get_job(job_id)
+
+    since = request.args.get('since', type=int)
+    payload = None
     with status_lock:
-        if download_status.get('is_downloading'):
-            last_progress_at = download_status.get('last_progress_at') or 0
-            if last_progress_at:
-                download_status['stalled_for'] = max(0, int(time.time() - last_progress_at))
+        etag = status_etag()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        if since is not None and since <= status_version:
+            payload = build_status_delta(since)
+            payload['since'] = since
+            if payload['version'] > since:
+                payload['status'] = build_focus_status()
+    if payload is None:
+        # No cursor, or one from before a restart: send everything
+        # (outside status_lock: the concurrency field takes concurrency.lock)
+        payload = build_status_payload()
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Push status changes as Server-Sent Events instead of being polled
+
+    The first message is a full `snapshot`; later `delta` messages only carry
+    the legacy status fields, job fields and log lines that changed, and are
+    coalesced to at most SSE_MAX_EVENTS_PER_SECOND.
+    """
+    min_interval = 1.0 / max(0.1, Config.SSE_MAX_EVENTS_PER_SECOND)
+
+    def generate():
+        snapshot = build_status_payload()
+        last_version = snapshot['version']
+        last_status = {key: value for key, value in snapshot.items() if key not in ('logs', 'jobs', 'version')}
+        last_job_ids = [job['id'] for job in snapshot['jobs']]
+        yield format_sse('snapshot', snapshot)
+
+        while True:
+            # Wake often enough while downloading to refresh stalled_for
+            timeout = 1.0 if last_status.get('is_downloading') else Config.SSE_KEEPALIVE_SECONDS
+            with status_changed:
+                status_changed.wait_for(lambda: status_version > last_version, timeout=timeout)
+                delta = build_status_delta(last_version)
+                status = build_focus_status()
+
+            changed_status = {key: value for key, value in status.items() if last_status.get(key) != value}
+            if delta['job_ids'] == last_job_ids:
+                del delta['job_ids']
+            else:
+                last_job_ids = delta['job_ids']
+            if not delta['logs_reset']:
+                del delta['logs_reset']
+
+            if changed_status or delta['jobs'] or delta['logs'] or 'job_ids' in delta or 'logs_reset' in delta:
+                delta['status'] = changed_status
+                yield format_sse('delta', delta)
             else:
-                download_status['stalled_for'] = 0
+                yield ': keepalive\n\n'
+            last_version = delta['version']
+            last_status = status
+            # Coalesce bursts of hook/log updates into one message
+            time.sleep(min_interval)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """API endpoint to list all known jobs, or the entries of one (?parent=<id>)"""
+    parent_id = request.args.get('parent')
+    with status_lock:
+        if parent_id:
+            parent = jobs.get(parent_id)
+            if parent is None:
+                return jsonify({'success': False, 'error': 'Job not found'}), 404
+            selected = parent['_children']
         else:
-            download_status['stalled_for'] = 0
-        if download_status.get('status') == 'downloading' and download_status.get('stalled_for', 0) >= 20:
-            current_action = download_status.get('current_action') or 'Downloading...'
-            download_status['current_action'] = f"No progress for {download_status['stalled_for']}s. {current_action}"
-
-        # Recovery: if download appears stuck near completion, finalize when media exists
-        if (
-            download_status.get('status') in ('downloading', 'processing', 'finalizing')
-            and download_status.get('active_downloads', 0) == 0
-            and (download_status.get('progress') or 0) >= 95
-        ):
-            folder = download_status.get('output_folder') or ''
-            media_found = False
-            if folder and os.path.isdir(folder):
-                video_exts = {'.mp4', '.mkv', '.webm', '.mov', '.flv', '.avi'}
-                audio_exts = {'.mp3', '.m4a', '.opus', '.aac', '.wav', '.flac'}
-                allowed_exts = audio_exts if download_status.get('mode') == 'Audio' else video_exts
-                try:
-                    for file in os.listdir(folder):
-                        ext = os.path.splitext(file)[1].lower()
-                        if ext in allowed_exts:
-                            media_found = True
-                            break
-                except Exception:
-                    media_found = False
-            if media_found:
-                download_status['status'] = 'completed'
-                download_status['progress'] = 100
-                download_status['current_action'] = 'Complete!'
-                download_status['eta'] = ''
-                download_status['speed'] = ''
-        return jsonify(download_status.copy())
+            selected = top_level_jobs()
+        return jsonify({'jobs': [job_snapshot(job) for job in selected]})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """API endpoint to get the status of a single job"""
+    with status_lock:
+        job = jobs.get(job_id)
+        if job is not None:
+            return jsonify(job_snapshot(job))
+    entry = download_spill.get(job_id) if download_spill.size() else None
+    if entry is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(spilled_job_snapshot(entry))
+
+
+@app.route('/api/jobs/<job_id>/timeline', methods=['GET'])
+def get_job_timeline(job_id):
+    """API endpoint for a job's phase spans (a playlist/channel job includes its entries)
+
+    `?format=chrome` returns Chrome trace-event JSON instead, one row per
+    job, to load in chrome://tracing or Perfetto.
+    """
+    with status_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        timelines = [(job, job_timeline(job))] + [(child, job_timeline(child)) for child in job['_children']]
+
+    if request.args.get('format') != 'chrome':
+        entries = [
+            {'job_id': child['id'], 'title': child['title'], 'status': child['status'], 'spans': spans}
+            for child, spans in timelines[1:]
+        ]
+        return jsonify({'success': True, 'job_id': job_id, 'spans': timelines[0][1], 'entries': entries})
+
+    events = []
+    for tid, (traced, spans) in enumerate(timelines, start=1):
+        label = traced['title'] or traced['url']
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': f"{label} [{traced['id']}]"}})
+        for span in spans:
+            events.append({
+                'name': span['name'],
+                'cat': span['phase'],
+                'ph': 'X',
+                'ts': int(span['start'] * 1e6),
+                'dur': int(span['duration'] * 1e6),
+                'pid': 1,
+                'tid': tid,
+                'args': {**span['args'], **({'running': True} if span.get('running') else {})},
+            })
+    response = jsonify({'traceEvents': events, 'displayTimeUnit': 'ms'})
+    response.headers['Content-Disposition'] = f'attachment; filename="job-{job_id}.trace.json"'
+    return response
+
+
+@app.route('/api/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """API endpoint to requeue a failed job, or the failed entries of a playlist"""
+    with status_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if job['_children']:
+            retry = [child for child in job['_children'] if child['status'] in ('error', 'cancelled')]
+        elif job['status'] in ('error', 'cancelled'):
+            retry = [job]
+        else:
+            retry = []
+        if not retry:
+            return jsonify({'success': False, 'error': 'Nothing to retry'}), 400
+        busy = [child['url'] for child in retry if child['url'] in active_downloads_urls or child['url'] in queued_urls]
+        if busy:
+            return jsonify({'success': False, 'error': 'This URL is already being downloaded', 'url': busy[0]}), 409
+
+    for child in retry:
+        requeue_job(child)
+    parent = job if job['_children'] else jobs.get(job['parent_id'] or '')
+    if parent is not None:
+        update_parent_progress(parent)
+    add_log(f"Retrying {len(retry)} job(s)", job)
+    return jsonify({'success': True, 'job_id': job_id, 'retried': len(retry)})
+
+
+@app.route('/api/jobs/<job_id>/bump', methods=['POST'])
+def bump_job(job_id):
+    """API endpoint to move a queued job (or a playlist's queued entries) to the front of the queue"""
+    with status_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        targets = [child['id'] for child in job['_children'] if child['status'] == 'queued'] or [job_id]
+    bumped = download_queue.reorder(targets)
+    if not bumped:
+        return jsonify({'success': False, 'error': 'Job is not queued'}), 400
+    add_log(f"Moved {len(bumped)} job(s) to the front of the queue", job)
+    return jsonify({'success': True, 'job_id': job_id, 'bumped': len(bumped)})
+
+
+@app.route('/api/queue', methods=['GET'])
+def get_queue():
+    """API endpoint listing queued jobs in the order they would start (`limit`, default 50)"""
+    limit = max(1, min(1000, request.args.get('limit', 50, type=int)))
+    order = download_queue.snapshot(limit)
+    with status_lock:
+        queued = [
+            {
+                'job_id': job_id,
+                'url': jobs[job_id]['url'] if job_id in jobs else '',
+                'title': jobs[job_id]['title'] if job_id in jobs else '',
+                'parent_id': jobs[job_id]['parent_id'] if job_id in jobs else '',
+                'client': entry['client'],
+                'priority': entry['priority'],
+                'bumped': bool(entry['bump']),
+                'estimate': entry['estimate'],
+            }
+            for job_id, entry in order
+        ]
+    return jsonify({'success': True, 'size': download_queue.qsize(), 'spilled': download_spill.size(), 'queue': queued})
+
+
+@app.route('/api/queue/reorder', methods=['POST'])
+def reorder_queue():
+    """API endpoint putting queued jobs at the front, in the order given by `job_ids`"""
+    data = request.get_json(silent=True) or {}
+    job_ids = data.get('job_ids')
+    if not isinstance(job_ids, list) or not all(isinstance(job_id, str) for job_id in job_ids):
+        return jsonify({'success': False, 'error': 'job_ids must be a list of job IDs'}), 400
+    moved = download_queue.reorder(job_ids)
+    return jsonify({'success': True, 'moved': moved})
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_single_job(job_id):
+    """API endpoint to cancel one job (a playlist/channel job cancels its entries)"""
+    with status_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        removed = None
+        if download_spill.size():
+            with spill_lock:
+                removed = download_spill.remove(job_id)
+                if removed:
+                    drop_spilled_entries({removed['parent_id']: 1})
+        if removed:
+            add_log(f"Cancelled spilled job {job_id}")
+            return jsonify({'success': True, 'job_id': job_id, 'message': 'Removed from the queue'})
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if not cancel_job(job):
+        return jsonify({'success': False, 'error': 'Job already finished'}), 400
+    return jsonify({'success': True, 'job_id': job_id, 'message': 'Cancellation requested'})
 
 
 @app.route('/api/cancel', methods=['POST'])
 def cancel_download():
-    """API endpoint to cancel current download (limited functionality)"""
-    # Note: yt-dlp doesn't support graceful cancellation
-    # This will just clear the queue and mark as cancelled
+    """API endpoint to cancel downloads
+
+    Without a body every queued and running job is cancelled. Optional
+    filters narrow it down: `status` ('queued' or 'active'), `folder`
+    (jobs saving into it or below) and `parent` (entries of one
+    playlist/channel job).
+    """
+    data = request.get_json(silent=True) or {}
+    status_filter = data.get('status')
+    if status_filter not in (None, 'queued', 'active'):
+        return jsonify({'success': False, 'error': "status must be 'queued' or 'active'"}), 400
+    folder = data.get('folder')
+    if folder:
+        folder = os.path.abspath(folder)
     get_download_status()
-    cancel_event.set()
-    cleared = 0
-    try:
-        while True:
-            item = download_queue.get_nowait()
-            if item is not None:
-                cleared += 1
-            download_queue.task_done()
-    except queue.Empty:
-        pass
 
     with status_lock:
-        queued_urls.clear()
+        if data.get('parent'):
+            parent = jobs.get(data['parent'])
+            if parent is None:
+                return jsonify({'success': False, 'error': 'Job not found'}), 404
+            candidates = list(parent['_children'])
+        elif status_filter:
+            candidates = list(jobs.values())
+        else:
+            # Parents cancel their own entries
+            candidates = top_level_jobs()
+        selected = []
+        for job in candidates:
+            if job['status'] in FINISHED_JOB_STATES:
+                continue
+            if status_filter == 'queued' and job['status'] != 'queued':
+                continue
+            if status_filter == 'active' and not is_working(job):
+                continue
+            if folder:
+                job_folder = os.path.abspath(job['_options']['folder'])
+                if job_folder != folder and not job_folder.startswith(folder + os.sep):
+                    continue
+            selected.append(job)
+
+    # Spilled submissions go first so none is admitted in place of a cancelled job
+    cancelled = 0
+    if status_filter != 'active' and download_spill.size():
+        with spill_lock:
+            removed = download_spill.clear(folder, parent_id=data.get('parent'))
+            drop_spilled_entries(removed)
+        cancelled += sum(removed.values())
+    cancelled += sum(1 for job in selected if cancel_job(job))
+    if not cancelled:
+        return jsonify({'success': False, 'error': 'No download in progress'}), 400
+    add_log(f"Cancel requested for {cancelled} job(s) (may leave partial files)")
+    return jsonify({'success': True, 'cancelled': cancelled, 'message': 'Cancellation requested'})
+
+
+@app.route('/api/archive/lookup', methods=['GET', 'POST'])
+def archive_lookup():
+    """API endpoint to check URLs or video IDs against the download archive
+
+    GET takes `?url=` (repeatable) or `?extractor=&id=`; POST takes
+    `{"urls": [...]}`. `mode` (Video/Audio) narrows the match.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        urls = data.get('urls') or []
+        mode = data.get('mode')
+    else:
+        urls = request.args.getlist('url')
+        mode = request.args.get('mode')
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({'success': False, 'error': 'urls must be a list of strings'}), 400
+
+    keys = [(url.strip(), archive_key_for_url(url.strip())) for url in urls if url.strip()]
+    if not urls and request.args.get('id'):
+        keys = [('', (request.args.get('extractor', 'youtube').lower(), request.args['id']))]
+    if not keys:
+        return jsonify({'success': False, 'error': 'A url or id is required'}), 400
+
+    results = []
+    for url, key in keys:
+        entry = download_archive.lookup(*key, mode) if key else None
+        results.append({
+            'url': url,
+            'extractor': key[0] if key else None,
+            'id': key[1] if key else None,
+            'archived': entry is not None,
+            'entry': entry,
+        })
+    return jsonify({'success': True, 'results': results})
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint: pipeline counters and histograms plus live gauges"""
+    now = time.time()
+    with status_lock:
+        by_status = collections.Counter(job['status'] for job in jobs.values())
+        downloading = [job for job in jobs.values() if is_working(job) and job['status'] == 'downloading']
+        throughput = sum(job['_speed_bps'] for job in downloading if now - job['last_progress_at'] < 5)
+        stalled = sum(1 for job in downloading if now - job['last_progress_at'] >= STALL_WARNING_SECONDS)
+        busy = busy_download_workers
+        pool_size = download_worker_target
+    uptime = max(now - metrics.started_at, 1e-9)
+
+    lines = metrics.render()
+    gauges = [
+        ('queue_depth', 'gauge', 'Jobs waiting in the download queue', [((), download_queue.qsize())]),
+        ('queue_spilled', 'gauge', 'Submissions waiting in the on-disk spill queue', [((), download_spill.size())]),
+        ('postprocess_queue_depth', 'gauge', 'Downloads waiting for the post-processing pool', [((), postprocess_queue.qsize())]),
+        ('jobs', 'gauge', 'Jobs in the registry, by status', [((('status', status),), count) for status, count in sorted(by_status.items())]),
+        ('download_workers', 'gauge', 'Download worker pool size', [((), pool_size)]),
+        ('download_workers_busy', 'gauge', 'Download workers currently running a job', [((), busy)]),
+        ('fragment_concurrency', 'gauge', 'Fragment connections per download', [((), concurrency.fragments)]),
+        ('throughput_bytes_per_second', 'gauge', 'Current combined download speed', [((), throughput)]),
+        ('average_throughput_bytes_per_second', 'gauge', 'Bytes downloaded per second since startup',
+         [((), metrics.value('downloaded_bytes_total') / uptime)]),
+        ('stalled_downloads', 'gauge', f'Downloads with no progress for {STALL_WARNING_SECONDS}s or more', [((), stalled)]),
+        ('status_lock_wait_seconds_total', 'counter', 'Time threads spent waiting for the status lock', [((), status_lock.wait_seconds)]),
+        ('status_lock_contended_total', 'counter', 'Status lock acquisitions that had to wait', [((), status_lock.contended)]),
+        ('uptime_seconds', 'gauge', 'Seconds since the server started', [((), uptime)]),
+    ]
+    for name, kind, help_text, samples in gauges:
+        lines.extend(metrics.sample_lines(name, kind, help_text, samples))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/concurrency', methods=['GET', 'POST'])
+def concurrency_settings():
+    """API endpoint to inspect or change download/fragment concurrency at runtime
+
+    POST accepts any of `workers`, `fragments` (clamped to the autotune
+    bounds) and `autotune` (true/false).
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            workers = int(data['workers']) if data.get('workers') is not None else None
+            fragments = int(data['fragments']) if data.get('fragments') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'workers and fragments must be integers'}), 400
+        autotune = data.get('autotune')
+        if autotune is not None and not isinstance(autotune, bool):
+            return jsonify({'success': False, 'error': 'autotune must be true or false'}), 400
+        concurrency.resize(workers, fragments, autotune)
+    return jsonify({'success': True, **concurrency.describe()})
+
+
+@app.route('/api/bandwidth', methods=['GET', 'POST'])
+def bandwidth_settings():
+    """API endpoint to inspect or change the shared bandwidth limit at runtime
 
+    POST replaces `limit`, `per_job_limit` (bytes/sec or sizes like "2M";
+    null = unlimited) and `schedule` (a list of {start, end, limit} windows
+    in local HH:MM time); omitted fields keep their current value.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        current = bandwidth.describe()
+        try:
+            bandwidth.configure(
+                data.get('limit', current['limit']),
+                data.get('per_job_limit', current['per_job_limit']),
+                data.get('schedule', current['schedule']),
+            )
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({'success': False, 'error': f'Invalid bandwidth settings: {e}'}), 400
+        add_log(f"Bandwidth limit set: {format_speed(bandwidth.current_limit()) or 'unlimited'}")
+    return jsonify({'success': True, **bandwidth.describe()})
+
+
+@app.route('/api/runtime/refresh', methods=['POST'])
+def refresh_runtime():
+    """API endpoint to re-detect FFmpeg, Node.js and cookies without a restart"""
+    env = get_runtime_environment(refresh=True)
+    add_log("Runtime environment refreshed")
+    return jsonify({'success': True, 'runtime': env.describe()})
+
+
+@app.route('/api/logs', methods=['GET'])
+def get_logs():
+    """API endpoint to fetch log lines after a cursor
+
+    `?job=<id>` selects a job's own log (default: the activity log) and
+    `?after=<seq>` returns only lines newer than that sequence number.
+    """
+    after = request.args.get('after', 0, type=int)
+    job_id = request.args.get('job')
+    get_download_status()
     with status_lock:
-        if download_status.get('is_downloading') or cleared > 0:
-            download_status['status'] = 'cancelled'
-            add_log("Cancel requested (may leave partial files)")
-            if cleared > 0:
-                add_log(f"Cleared {cleared} queued download(s)")
-            return jsonify({'success': True, 'message': 'Cancellation requested'})
+        if job_id:
+            job = jobs.get(job_id)
+            if job is None:
+                return jsonify({'success': False, 'error': 'Job not found'}), 404
+            log = job['logs']
         else:
-            return jsonify({'success': False, 'error': 'No download in progress'}), 400
+            log = download_status['logs']
+        entries = logs_after(log, after)
+        # A full buffer that is entirely new may have dropped lines past the cursor
+        truncated = len(entries) == len(log) == log.maxlen
+        last_seq = log[-1][0] if log else after
+    return jsonify({
+        'logs': [{'seq': seq, 'line': line} for seq, line in entries],
+        'last_seq': max(after, last_seq),
+        'truncated': truncated,
+    })
 
 
 @app.route('/api/clear_logs', methods=['POST'])
@@ -929,14 +3952,194 @@ def clear_logs():
     """API endpoint to clear activity logs"""
     get_download_status()
     with status_lock:
-        download_status['logs'] = []
+        download_status['logs'].clear()
+        download_status['logs_cleared_at'] = bump_status_version()
     return jsonify({'success': True})
 
 
+class SendfileBody:
+    """Response body that passes a byte range of a file to socket.sendfile()
+
+    Yielding b'' first makes Werkzeug's server send the status line and
+    headers; the file is then copied to the socket by the kernel
+    (os.sendfile) instead of being read through Python in 8 KiB blocks.
+    """
+
+    def __init__(self, path, offset, count, sock):
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.sock = sock
+
+    def __iter__(self):
+        yield b''
+        if self.count:
+            with open(self.path, 'rb') as file:
+                self.sock.sendfile(file, self.offset, self.count)
+
+
+def send_media_file(path, as_attachment=False):
+    """Serve a file with Range, ETag/Last-Modified and 304 support
+
+    On the built-in server the body is sent with sendfile; other WSGI
+    servers get the regular response and their own wsgi.file_wrapper.
+    """
+    path = os.path.abspath(path)
+    response = send_file(path, conditional=True, etag=True, as_attachment=as_attachment)
+    sock = request.environ.get('werkzeug.socket')
+    if Config.SENDFILE_DOWNLOADS and sock is not None and request.method == 'GET' and response.status_code in (200, 206):
+        if response.status_code == 206:
+            offset, count = response.content_range.start, response.content_range.stop - response.content_range.start
+        else:
+            offset, count = 0, response.content_length or 0
+        response.response.close()  # The file object send_file() opened
+        response.response = SendfileBody(path, offset, count, sock)
+    return response
+
+
 @app.route('/downloads/<path:filename>')
 def serve_download(filename):
-    """Serve downloaded files"""
-    return send_from_directory(Config.DEFAULT_DOWNLOAD_FOLDER, filename)
+    """Serve downloaded files from the default download folder"""
+    path = werkzeug.security.safe_join(Config.DEFAULT_DOWNLOAD_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_media_file(path)
+
+
+@app.route('/api/jobs/<job_id>/file')
+def serve_job_file(job_id):
+    """Serve a completed job's output file from the folder it was downloaded to
+
+    `?download=1` sends it as an attachment.
+    """
+    with status_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if job['status'] != 'completed' or not job['filename']:
+            return jsonify({'success': False, 'error': 'Job has no output file'}), 404
+        path = os.path.join(job['output_folder'], job['filename'])
+    if not os.path.isfile(path):
+        return jsonify({'success': False, 'error': 'Output file no longer exists'}), 404
+    return send_media_file(path, as_attachment=request.args.get('download') == '1')
+
+
+ARCHIVE_CHUNK_SIZE = 1048576  # Bytes read per step while streaming an archive
+
+
+class ArchiveSink(io.RawIOBase):
+    """Write-only, unseekable buffer an archive writer fills and the response drains"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def job_output_files(job):
+    """(path, archive name) of each file a finished job produced: its own and its entries'"""
+    with status_lock:
+        produced = [job] + list(job['_children'])
+        base = job['output_folder']
+        files = []
+        for source in produced:
+            if source['status'] != 'completed' or not source['filename']:
+                continue
+            path = os.path.join(source['output_folder'], source['filename'])
+            name = os.path.relpath(path, base) if base else source['filename']
+            if name.startswith('..'):
+                name = source['filename']
+            files.append((path, name.replace(os.sep, '/')))
+    return [(path, name) for path, name in files if os.path.isfile(path)]
+
+
+def stream_zip(files):
+    """Yield a store-only ZIP of files chunk by chunk (ZIP64 where sizes need it)"""
+    sink = ArchiveSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path, name in files:
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(name, time.localtime(stat.st_mtime)[:6])
+            info.file_size = stat.st_size  # Picks the ZIP64 header up front for files over 4 GiB
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                while chunk := source.read(ARCHIVE_CHUNK_SIZE):
+                    target.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()  # Central directory
+
+
+def stream_tar(files):
+    """Yield an uncompressed PAX TAR of files chunk by chunk"""
+    written = 0
+    for path, name in files:
+        stat = os.stat(path)
+        info = tarfile.TarInfo(name)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        header = info.tobuf(format=tarfile.PAX_FORMAT)
+        written += len(header)
+        yield header
+        with open(path, 'rb') as source:
+            remaining = info.size
+            while remaining > 0 and (chunk := source.read(min(ARCHIVE_CHUNK_SIZE, remaining))):
+                remaining -= len(chunk)
+                written += len(chunk)
+                yield chunk
+        padding = -info.size % tarfile.BLOCKSIZE
+        written += padding
+        yield tarfile.NUL * padding
+    # Two zero blocks end the archive; pad to a whole record like tarfile does
+    end = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+    written += len(end)
+    yield end + tarfile.NUL * (-written % tarfile.RECORDSIZE)
+
+
+@app.route('/api/jobs/<job_id>/archive')
+def download_job_archive(job_id):
+    """API endpoint streaming every file a finished job produced as one ZIP (default) or TAR
+
+    Nothing is compressed or staged on disk: `?format=zip|tar` is generated
+    while it is sent, so memory use stays constant whatever the size.
+    """
+    archive_format = request.args.get('format', 'zip')
+    if archive_format not in ('zip', 'tar'):
+        return jsonify({'success': False, 'error': "format must be 'zip' or 'tar'"}), 400
+    with status_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if job['status'] not in FINISHED_JOB_STATES:
+            return jsonify({'success': False, 'error': 'Job is still running'}), 409
+        title = job['title'] or job['id']
+    files = job_output_files(job)
+    if not files:
+        return jsonify({'success': False, 'error': 'Job has no output files'}), 404
+
+    download_name = f"{yt_dlp.utils.sanitize_filename(title)}.{archive_format}"
+    disposition = {'filename': unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')}
+    if disposition['filename'] != download_name:
+        disposition['filename*'] = "UTF-8''" + urllib.parse.quote(download_name, safe="!#$&+^`|")
+    body = stream_zip(files) if archive_format == 'zip' else stream_tar(files)
+    response = Response(
+        body,
+        mimetype='application/zip' if archive_format == 'zip' else 'application/x-tar',
+    )
+    response.headers.set('Content-Disposition', 'attachment', **disposition)
+    add_log(f"Streaming {archive_format.upper()} of {len(files)} file(s)", job)
+    return response
 
 
 def get_local_ip():
@@ -0,0 +1,165 @@
+# bench_playlist_memory.py
+# Peak memory benchmark for huge playlists/channels
+#
+# Usage: python benchmarks/bench_playlist_memory.py [entries]
+#
+# Registers a synthetic extractor whose playlist yields `entries` videos, each
+# with realistic format/thumbnail/subtitle lists, and reports peak RSS for:
+#   retained  - one extract_info() over the whole playlist, result kept until
+#               the job ends (the previous single-job behaviour)
+#   streaming - the app's own path: a playlist job submitted to /api/download,
+#               fanned out by fan_out_playlist_job() (through admit_entry() and
+#               the spill queue) and every entry run by download_worker() and
+#               complete_download()
+# Each mode runs in its own process so the peaks don't mix. Entries "download"
+# a few KiB from a local file:// source, so nothing touches the network.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+import yt_dlp.globals  # noqa: E402
+from yt_dlp.extractor import gen_extractor_classes  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+
+YDL_OPTS = {'quiet': True, 'no_warnings': True, 'simulate': True}
+SUBTITLE_LANGS = ['en', 'de', 'fr', 'es', 'it', 'pt', 'ru', 'ja', 'ko', 'zh-Hans', 'ar', 'hi', 'tr', 'pl', 'nl']
+if 'BENCH_WORK_FOLDER' not in os.environ:
+    os.environ['BENCH_WORK_FOLDER'] = tempfile.mkdtemp(prefix='ytdl-bench-')
+WORK_FOLDER = os.environ['BENCH_WORK_FOLDER']
+SOURCE_FILE = os.path.join(WORK_FOLDER, 'source.mp4')
+
+
+class SyntheticIE(InfoExtractor):
+    """Offline extractor: synthetic://playlist/<count> and synthetic://video/<n>"""
+    _VALID_URL = r'synthetic://(?P<kind>playlist|video)/(?P<id>\d+)'
+
+    def _real_extract(self, url):
+        kind, item_id = self._match_valid_url(url).group('kind', 'id')
+        if kind == 'playlist':
+            entries = (
+                self.url_result(f'synthetic://video/{n}', SyntheticIE, f'v{n}', f'Synthetic video {n}')
+                for n in range(int(item_id))
+            )
+            return self.playlist_result(entries, 'synthetic', 'Synthetic playlist')
+
+        signature = 'sig=' + 'a' * 600
+        return {
+            'id': f'v{item_id}',
+            'title': f'Synthetic video {item_id}',
+            'description': 'Lorem ipsum dolor sit amet. ' * 80,
+            'webpage_url': url,
+            'duration': 600,
+            # Every format is muxed (no audio-only ones), so any selection ends
+            # on a single file and no FFmpeg merge is needed
+            'formats': [{
+                'format_id': str(n),
+                'url': 'file://' + SOURCE_FILE,
+                'manifest_url': f'https://media.invalid/{item_id}/{n}.mpd?{signature}',
+                'ext': 'mp4',
+                'height': 144 * (n % 8 + 1),
+                'tbr': 100 + n * 50,
+                'vcodec': 'avc1.64001F',
+                'acodec': 'mp4a.40.2',
+                'http_headers': {'User-Agent': 'Mozilla/5.0 (synthetic)', 'Referer': url},
+            } for n in range(60)],
+            'thumbnails': [{
+                'id': str(n),
+                'url': f'https://img.invalid/{item_id}/{n}.jpg',
+                'width': 120 * (n % 6 + 1),
+                'height': 90 * (n % 6 + 1),
+            } for n in range(40)],
+            'subtitles': {
+                lang: [{'url': f'https://subs.invalid/{item_id}.{lang}.{ext}?{signature}', 'ext': ext}
+                       for ext in ('vtt', 'srv3', 'json3')]
+                for lang in SUBTITLE_LANGS
+            },
+        }
+
+
+def register_synthetic_extractor():
+    """Make SyntheticIE known to every YoutubeDL instance, the app's included"""
+    gen_extractor_classes()  # Load the built-in extractors first
+    yt_dlp.globals.extractors.value = {'SyntheticIE': SyntheticIE, **yt_dlp.globals.extractors.value}
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process in MiB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1048576 if sys.platform == 'darwin' else 1024)
+
+
+def run_retained(entries):
+    """Process the whole playlist in one call and keep the result"""
+    with yt_dlp.YoutubeDL(YDL_OPTS) as ydl:
+        info = ydl.extract_info(f'synthetic://playlist/{entries}', download=False, ie_key='Synthetic')
+        return len(info['entries'])
+
+
+def run_streaming(entries):
+    """Submit the playlist like a client and wait for the workers to finish it"""
+    import types
+    from config import Config
+
+    # Keep the synthetic jobs out of the real job store and download folder
+    Config.PERSIST_JOBS = False
+    Config.AUTOTUNE_CONCURRENCY = False
+    Config.COOKIES_FROM_BROWSER = ''
+    Config.DEFAULT_DOWNLOAD_FOLDER = WORK_FOLDER
+    Config.ARCHIVE_FILE = os.path.join(WORK_FOLDER, '.download_archive.db')
+    Config.JOB_STORE_FILE = os.path.join(WORK_FOLDER, '.jobs.db')
+    Config.SPILL_QUEUE_FILE = os.path.join(WORK_FOLDER, '.queue_spill.db')
+
+    import app  # noqa: E402  (starts the download and post-processing workers)
+
+    env = app.get_runtime_environment()
+    env.base_ydl_opts = types.MappingProxyType({**env.base_ydl_opts, 'enable_file_urls': True})
+    response = app.app.test_client().post('/api/download', json={
+        'url': f'synthetic://playlist/{entries}',
+        'folder': os.path.join(WORK_FOLDER, 'out'),
+        'download_type': 'playlist',
+    }).get_json()
+    parent = app.jobs[response['job_id']]
+    while parent['status'] not in app.FINISHED_JOB_STATES:
+        time.sleep(0.2)
+    if parent['status'] != 'completed':
+        raise SystemExit(f"Playlist job ended '{parent['status']}': {parent['current_action']}")
+    return parent['playlist_completed']
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--mode':
+        mode, entries = sys.argv[2], int(sys.argv[3])
+        with open(SOURCE_FILE, 'wb') as source:
+            source.write(os.urandom(4096))
+        register_synthetic_extractor()
+        started = time.perf_counter()
+        count = (run_retained if mode == 'retained' else run_streaming)(entries)
+        print(f"{count} {time.perf_counter() - started:.2f} {peak_rss_mib():.1f}")
+        return
+
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"\nPlaylist memory: {entries} synthetic entries")
+    try:
+        for mode in ('retained', 'streaming'):
+            # The child processes share this process's work folder (BENCH_WORK_FOLDER)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--mode', mode, str(entries)],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            count, seconds, peak = output.split()
+            print(f"  {mode:<10} {int(count):6d} entries in {float(seconds):6.2f}s, peak RSS {float(peak):8.1f} MiB")
+    finally:
+        shutil.rmtree(WORK_FOLDER, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
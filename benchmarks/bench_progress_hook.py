@@ -0,0 +1,124 @@
+# bench_progress_hook.py
+# Micro-benchmark for the yt-dlp progress hook hot path
+#
+# Usage: python benchmarks/bench_progress_hook.py [calls]
+#
+# Drives the hook with synthetic 'downloading' progress dicts (as yt-dlp emits
+# them for every chunk) and reports calls/sec for the previous string-parsing
+# implementation and the current throttled one.
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+# Keep the synthetic jobs out of the real job store and download folder
+Config.PERSIST_JOBS = False
+Config.DEFAULT_DOWNLOAD_FOLDER = tempfile.mkdtemp(prefix='ytdl-bench-')
+Config.ARCHIVE_FILE = os.path.join(Config.DEFAULT_DOWNLOAD_FOLDER, '.download_archive.db')
+Config.JOB_STORE_FILE = os.path.join(Config.DEFAULT_DOWNLOAD_FOLDER, '.jobs.db')
+Config.SPILL_QUEUE_FILE = os.path.join(Config.DEFAULT_DOWNLOAD_FOLDER, '.queue_spill.db')
+
+import app  # noqa: E402  (starts the download workers, which stay idle)
+
+
+def legacy_progress_hook(job, d):
+    """The progress hook as it was before throttling (string parsing per call)"""
+    with app.status_lock:
+        info = d.get('info_dict') if isinstance(d, dict) else None
+        if info:
+            playlist_total = info.get('playlist_count')
+            playlist_index = info.get('playlist_index')
+            if isinstance(playlist_total, int) and playlist_total > 1:
+                job['playlist_total'] = playlist_total
+            if isinstance(playlist_index, int) and playlist_index > 0:
+                job['playlist_current'] = playlist_index
+
+        percent_str = app.strip_ansi(d.get('_percent_str', '0%')).strip()
+        speed_str = app.strip_ansi(d.get('_speed_str', 'N/A')).strip()
+        eta_str = app.strip_ansi(d.get('_eta_str', 'N/A')).strip()
+
+        percent = None
+        if percent_str and percent_str != '0%':
+            try:
+                percent = float(re.sub(r'[^\d.]', '', percent_str))
+            except Exception:
+                percent = None
+        if percent is None:
+            percent = job.get('progress', 0)
+
+        job['progress'] = percent
+        job['status'] = 'downloading'
+        if eta_str in ('', 'N/A') or 'Unknown' in eta_str:
+            eta_str = ''
+        job['speed'] = speed_str
+        job['eta'] = eta_str
+        job['last_progress_at'] = time.time()
+        job['stalled_for'] = 0
+        if 'info_dict' in d:
+            job['title'] = d['info_dict'].get('title', 'Unknown')
+        if percent < 5:
+            job['current_action'] = f'Initializing download ({percent_str})'
+        elif percent < 25:
+            job['current_action'] = f'Downloading stream ({percent_str})'
+        elif percent < 75:
+            job['current_action'] = f'Downloading data ({percent_str})'
+        elif percent < 95:
+            job['current_action'] = f'Completing download ({percent_str})'
+        else:
+            job['current_action'] = f'Finalizing download ({percent_str})'
+
+
+def make_progress_dicts(count, total_bytes=500 * 1048576):
+    """Build synthetic progress dicts like yt-dlp's HTTP/fragment downloaders"""
+    info = {'id': 'bench', 'title': 'Benchmark video', 'playlist_count': None, 'playlist_index': None}
+    chunk = total_bytes // count
+    dicts = []
+    for i in range(1, count + 1):
+        downloaded = chunk * i
+        percent = downloaded * 100.0 / total_bytes
+        dicts.append({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': total_bytes,
+            'elapsed': i * 0.01,
+            'speed': 8.5 * 1048576,
+            'eta': (total_bytes - downloaded) / (8.5 * 1048576),
+            'info_dict': info,
+            '_percent_str': f'\x1b[0;94m{percent:5.1f}%\x1b[0m',
+            '_speed_str': '\x1b[0;32m   8.50MiB/s\x1b[0m',
+            '_eta_str': '\x1b[0;33m00:42\x1b[0m',
+        })
+    return dicts
+
+
+def run(hook, job, dicts):
+    """Return calls/sec for driving `hook` with every dict once"""
+    started = time.perf_counter()
+    for d in dicts:
+        hook(job, d)
+    return len(dicts) / (time.perf_counter() - started)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    dicts = make_progress_dicts(calls)
+    options = {'folder': app.Config.DEFAULT_DOWNLOAD_FOLDER, 'mode': 'Video', 'download_type': 'single'}
+
+    legacy_rate = run(legacy_progress_hook, app.create_job('bench://legacy', options), dicts)
+    current_rate = run(app.progress_hook, app.create_job('bench://current', options), dicts)
+
+    print(f"\nprogress_hook: {calls} synthetic 'downloading' calls")
+    print(f"  before (string parsing, every call): {legacy_rate:12,.0f} calls/sec")
+    print(f"  after  (numeric, throttled):        {current_rate:12,.0f} calls/sec")
+    print(f"  speedup: {current_rate / legacy_rate:.1f}x "
+          f"(publishing at most {app.Config.PROGRESS_UPDATES_PER_SECOND}/s per job)")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,18 +13,63 @@ class Config:
     HOST = '0.0.0.0'  # Accessible from network; use '127.0.0.1' for localhost only
     PORT = 5000
     DEBUG = False  # Set to False in production
+    SENDFILE_DOWNLOADS = True  # Serve finished files with zero-copy sendfile on the built-in server
     
     # Download settings
     DEFAULT_DOWNLOAD_FOLDER = os.path.join(os.getcwd(), 'downloads')
-    MAX_CONCURRENT_DOWNLOADS = 3
+    MAX_CONCURRENT_DOWNLOADS = 3  # Starting pool size (tuned at runtime when AUTOTUNE_CONCURRENCY is on)
+    POSTPROCESS_WORKERS = None  # Parallel FFmpeg post-processing jobs (None = CPU count, 0 = run inside the download worker)
+    MAX_QUEUED_JOBS = 100  # Pending submissions kept in memory; later ones wait in SPILL_QUEUE_FILE
+    MAX_QUEUED_ENTRIES = 500  # Playlist/batch entries kept in memory; later ones wait in SPILL_QUEUE_FILE
+    MAX_SPILLED_JOBS = 100000  # Jobs waiting on disk before new submissions are rejected (0 = no spilling)
+    MAX_BATCH_URLS = 5000  # URLs accepted by one /api/download/batch request
+    SCHEDULER_SHORTEST_FIRST = False  # Start each client's shortest known video first instead of oldest
+    SCHEDULER_AGING_SECONDS = 600  # Queued playlist/channel work waiting this long competes with single videos
+    PLAYLIST_FAN_OUT = True  # Split playlist/channel jobs into per-video jobs shared by all workers
+    PLAYLIST_ENTRY_LOG_LIMIT = 20  # Lines kept per playlist entry job
+    JOB_HISTORY_LIMIT = 50  # Finished jobs kept for /api/jobs
+    STUCK_JOB_CHECK_INTERVAL = 30  # Seconds between checks for jobs stuck after writing their output
+    ACTIVITY_LOG_LIMIT = 100  # Lines kept in the shared activity log
+    JOB_LOG_LIMIT = 100  # Default lines kept per job (override with 'log_limit')
+    MAX_JOB_LOG_LIMIT = 5000  # Upper bound for a job's 'log_limit'
+    ARCHIVE_ENABLED = True  # Skip videos already recorded in the download archive
+    ARCHIVE_FILE = os.path.join(DEFAULT_DOWNLOAD_FOLDER, '.download_archive.db')  # Kept with the downloads so it survives container rebuilds
+    PERSIST_JOBS = True  # Keep jobs in JOB_STORE_FILE and resume unfinished ones after a restart
+    JOB_STORE_FILE = os.path.join(DEFAULT_DOWNLOAD_FOLDER, '.jobs.db')
+    SPILL_QUEUE_FILE = os.path.join(DEFAULT_DOWNLOAD_FOLDER, '.queue_spill.db')  # Overflow of the download queue
     USE_NODE_RUNTIME = True  # Prefer JS runtime to fix nsig extraction issues
 
+    # Live status stream (/api/events)
+    SSE_MAX_EVENTS_PER_SECOND = 4  # Coalesce updates to at most this many messages per client
+    SSE_KEEPALIVE_SECONDS = 15  # Idle keepalive interval
+
     # Download tuning (stability)
     SOCKET_TIMEOUT = 60
     RETRIES = 20
     FRAGMENT_RETRIES = 20
     CONCURRENT_FRAGMENT_DOWNLOADS = 2
     HTTP_CHUNK_SIZE = 1048576  # 1MB chunks to avoid long stalls
+    PROGRESS_UPDATES_PER_SECOND = 2  # Max 'downloading' status updates per job
+
+    # Bandwidth (bytes/sec or sizes like '2M'; None = unlimited)
+    BANDWIDTH_LIMIT = None  # Total across all downloads
+    BANDWIDTH_PER_JOB_LIMIT = None
+    BANDWIDTH_SCHEDULE = []  # (start, end, limit) windows in local time, e.g. [('08:00', '18:00', '2M')]
+
+    # Adaptive concurrency (AIMD on downloads and fragment connections)
+    AUTOTUNE_CONCURRENCY = False  # Opt in; when off the pool and fragment counts stay as configured
+    AUTOTUNE_INTERVAL = 15  # Seconds between adjustments
+    AUTOTUNE_MIN_DOWNLOADS = 1
+    AUTOTUNE_MAX_DOWNLOADS = 6
+    AUTOTUNE_MIN_FRAGMENTS = 1
+    AUTOTUNE_MAX_FRAGMENTS = 8
+    AUTOTUNE_STALL_SECONDS = 60  # No progress for this long counts as a stall
+    AUTOTUNE_BACKOFF_RATIO = 0.25  # Back off when this share of working downloads stalled or got throttled in an interval
+
+    # Extraction reuse between Preview and Start Download
+    METADATA_CACHE_SIZE = 64  # Info dicts kept (LRU)
+    METADATA_CACHE_TTL = 600  # Seconds; stream URLs expire, so keep this short
+    FALLBACK_MEMORY_TTL = 6 * 3600  # Seconds a per-site fallback (alt clients / no cookies) is reused
     
     # yt-dlp default options
     DEFAULT_QUALITY = 'Best'
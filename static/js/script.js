@@ -11,9 +11,18 @@ let channelOptionsGroup, downloadTypeRadios;
 let statusInterval = null;
 let statusPollTimer = null;
 let statusFetchInFlight = false;
+let statusPollingActive = false;
 let statusPollDelay = 1000;
+let statusVersion = null;
+let statusEtag = null;
 let isDownloading = false;
 
+// Status stream (Server-Sent Events), polling is the fallback
+let statusSource = null;
+let statusStreamRetryTimer = null;
+let currentStatus = {};
+let lastLogSeq = 0;
+
 // Initialize
 document.addEventListener('DOMContentLoaded', function() {
     console.log('YT Downloader Plus JS loaded');
@@ -98,18 +107,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // Start status polling (adaptive interval)
-    startStatusPolling();
+    // Start live status updates (stream, or adaptive polling if unsupported)
+    startStatusUpdates();
 
-    // Pause polling when tab is hidden
+    // Pause updates when tab is hidden
     document.addEventListener('visibilitychange', () => {
         if (document.hidden) {
-            if (statusPollTimer) {
-                clearTimeout(statusPollTimer);
-                statusPollTimer = null;
-            }
+            stopStatusUpdates();
         } else {
-            startStatusPolling();
+            startStatusUpdates();
         }
     });
 });
@@ -268,25 +274,147 @@ function scheduleStatusPoll(delay) {
 
         statusFetchInFlight = true;
         try {
-            const response = await fetch('/api/status', { cache: 'no-store' });
-            const status = await response.json();
-            updateStatus(status);
+            // Ask only for changes since the last seen version; 304 if none
+            const url = statusVersion === null ? '/api/status' : `/api/status?since=${statusVersion}`;
+            const headers = statusEtag ? { 'If-None-Match': statusEtag } : {};
+            const response = await fetch(url, { cache: 'no-store', headers });
+            if (response.status !== 304) {
+                statusEtag = response.headers.get('ETag');
+                const status = await response.json();
+                if ('since' in status) {
+                    applyStatusDelta(status);
+                } else {
+                    applyStatusSnapshot(status);
+                }
+                statusVersion = status.version;
+            }
             statusPollDelay = 1000;
         } catch (error) {
             console.error('Status polling error:', error);
             statusPollDelay = Math.min(5000, statusPollDelay + 500);
         } finally {
             statusFetchInFlight = false;
-            scheduleStatusPoll(statusPollDelay);
+            if (statusPollingActive) {
+                scheduleStatusPoll(statusPollDelay);
+            }
         }
     }, delay);
 }
 
 function startStatusPolling() {
+    statusPollingActive = true;
     statusPollDelay = 1000;
     scheduleStatusPoll(statusPollDelay);
 }
 
+function stopStatusPolling() {
+    statusPollingActive = false;
+    if (statusPollTimer) {
+        clearTimeout(statusPollTimer);
+        statusPollTimer = null;
+    }
+    statusVersion = null;
+    statusEtag = null;
+}
+
+// Subscribe to pushed status changes; fall back to polling on failure
+function startStatusUpdates() {
+    if (!window.EventSource) {
+        startStatusPolling();
+        return;
+    }
+    if (statusSource) {
+        return;
+    }
+
+    statusSource = new EventSource('/api/events');
+
+    statusSource.addEventListener('snapshot', (event) => {
+        stopStatusPolling();
+        applyStatusSnapshot(JSON.parse(event.data));
+    });
+
+    statusSource.addEventListener('delta', (event) => {
+        applyStatusDelta(JSON.parse(event.data));
+    });
+
+    statusSource.onerror = () => {
+        // Stream dropped or unsupported by a proxy: poll, then retry later
+        stopStatusStream();
+        startStatusPolling();
+        statusStreamRetryTimer = setTimeout(() => {
+            statusStreamRetryTimer = null;
+            if (!document.hidden) {
+                startStatusUpdates();
+            }
+        }, 15000);
+    };
+}
+
+function stopStatusStream() {
+    if (statusSource) {
+        statusSource.close();
+        statusSource = null;
+    }
+    if (statusStreamRetryTimer) {
+        clearTimeout(statusStreamRetryTimer);
+        statusStreamRetryTimer = null;
+    }
+}
+
+function stopStatusUpdates() {
+    stopStatusStream();
+    stopStatusPolling();
+}
+
+// Replace the last known status with a full payload
+function applyStatusSnapshot(snapshot) {
+    // Only render lines newer than the last one shown; the server log
+    // carries sequence numbers so nothing needs to be re-diffed in the DOM
+    const logs = snapshot.logs || [];
+    const logSeq = snapshot.log_seq || 0;
+    if (logSeq < lastLogSeq) {
+        logsDiv.innerHTML = '';
+        lastLogSeq = 0;
+    }
+    if (lastLogSeq === 0 && logs.length > 0) {
+        logsDiv.innerHTML = '';
+        logs.forEach(line => addLog(line));
+    } else if (logSeq > lastLogSeq) {
+        fetchLogsAfter(lastLogSeq, logSeq);
+    }
+    lastLogSeq = Math.max(lastLogSeq, logSeq);
+
+    delete snapshot.logs;
+    currentStatus = snapshot;
+    updateStatus(currentStatus);
+}
+
+// Fetch and append only the log lines in (after, upTo]; later lines arrive as deltas
+async function fetchLogsAfter(after, upTo) {
+    try {
+        const response = await fetch(`/api/logs?after=${after}`, { cache: 'no-store' });
+        const data = await response.json();
+        data.logs.filter(entry => entry.seq <= upTo).forEach(entry => addLog(entry.line));
+    } catch (error) {
+        console.error('Log fetch error:', error);
+    }
+}
+
+// Merge a pushed or polled delta into the last known status
+function applyStatusDelta(delta) {
+    if (delta.logs_reset) {
+        logsDiv.innerHTML = '';
+    }
+    (delta.logs || []).forEach(line => addLog(line));
+    if (delta.logs && delta.logs.length > 0) {
+        lastLogSeq = Math.max(lastLogSeq, delta.version);
+    }
+
+    Object.assign(currentStatus, delta.status || {});
+    updateStatus(currentStatus);
+}
+
 // Update UI with status from server
 function updateStatus(status) {
     if (status.is_downloading && !isDownloading) {
@@ -357,27 +485,6 @@ function updateStatus(status) {
         document.getElementById('currentTitle').style.display = 'none';
     }
 
-    // Update logs - add new ones from server
-    if (status.logs && status.logs.length > 0) {
-        // Get current log entries in UI
-        const logElements = logsDiv.querySelectorAll('.log-entry');
-        let currentCount = logElements.length;
-        const serverCount = status.logs.length;
-        
-        // If server logs were reset, reset UI logs too
-        if (serverCount < currentCount) {
-            logsDiv.innerHTML = '';
-            currentCount = 0;
-        }
-
-        // Add any new logs from the server
-        if (serverCount > currentCount) {
-            for (let i = currentCount; i < serverCount; i++) {
-                addLog(status.logs[i]);
-            }
-        }
-    }
-
     // Check if download finished
     if (status.status === 'completed' || status.status === 'error' || status.status === 'cancelled') {
         isDownloading = false;